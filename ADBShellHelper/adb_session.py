@@ -0,0 +1,134 @@
+import os
+import queue
+import subprocess
+import threading
+import uuid
+from collections import namedtuple
+
+ShellResult = namedtuple("ShellResult", "output status")
+
+# Seconds to wait for one command before the session is considered stuck.
+DEFAULT_TIMEOUT = 30
+
+# The adb executable; point ADB at fake_adb.py to run without a device.
+ADB = os.environ.get("ADB", "adb")
+
+
+class AdbShell:
+    """One long-lived `adb shell` process that runs commands in turn.
+
+    Each command is written to the shell's stdin followed by a printf of a
+    random sentinel and the exit status, so its output is everything up to
+    that sentinel line. Callers on several threads share the session; their
+    commands are serialized by a lock. If the shell has died it is started
+    again on the next command.
+    """
+
+    def __init__(self, serial=None, adb=ADB):
+        self.serial = serial
+        self.adb = adb
+        self.proc = None
+        self.lines = None
+        self.lock = threading.Lock()
+
+    def _argv(self):
+        argv = [self.adb]
+        if self.serial:
+            argv += ["-s", self.serial]
+        return argv + ["shell"]
+
+    def _start(self):
+        self.proc = subprocess.Popen(
+            self._argv(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        # A reader thread keeps timeouts portable (select() can't wait on
+        # pipes on Windows)
+        self.lines = queue.Queue()
+        threading.Thread(
+            target=self._read, args=(self.proc.stdout, self.lines), daemon=True
+        ).start()
+
+    @staticmethod
+    def _read(stream, lines):
+        for line in iter(stream.readline, b""):
+            lines.put(line)
+        lines.put(None)
+
+    def _alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def run(self, command, timeout=DEFAULT_TIMEOUT):
+        """Run command in the session and return a ShellResult.
+
+        stderr is folded into the output. Raises TimeoutError if no sentinel
+        arrives within timeout seconds, and ConnectionError if the shell
+        exits mid-command; either way the next call starts a new shell.
+        A command is only retried when it could not be sent at all.
+        """
+        marker = f"__ADB_END_{uuid.uuid4().hex}__"
+        payload = f"{{ {command}\n}} 2>&1; printf '\\n{marker} %d\\n' $?\n".encode()
+        with self.lock:
+            for attempt in range(2):
+                if not self._alive():
+                    self._start()
+                try:
+                    self.proc.stdin.write(payload)
+                    self.proc.stdin.flush()
+                    break
+                except (BrokenPipeError, OSError):
+                    self.close()
+                    if attempt:
+                        raise ConnectionError("adb shell is not accepting input")
+
+            out = []
+            while True:
+                try:
+                    line = self.lines.get(timeout=timeout)
+                except queue.Empty:
+                    self.close()
+                    raise TimeoutError(f"adb shell timed out on: {command}")
+                if line is None:
+                    self.close()
+                    # adb's own error (no device, several devices, ...) is
+                    # usually the last thing it printed
+                    said = next((text for text in reversed(out) if text), "")
+                    raise ConnectionError(
+                        f"adb shell exited during: {command}"
+                        + (f" ({said})" if said else "")
+                    )
+                text = line.decode(errors="replace").rstrip("\r\n")
+                if text.startswith(marker):
+                    status = int(text[len(marker) :].strip() or 0)
+                    break
+                out.append(text)
+
+        # printf put a newline before the sentinel
+        if out and out[-1] == "":
+            out.pop()
+        return ShellResult("\n".join(out).strip(), status)
+
+    def shell(self, command, timeout=DEFAULT_TIMEOUT):
+        """Run command and return only its output."""
+        return self.run(command, timeout).output
+
+    def close(self):
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+            try:
+                self.proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+            self.proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
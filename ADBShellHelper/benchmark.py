@@ -0,0 +1,162 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import main as helper
+from adb_session import AdbShell
+from bulk import run_bulk
+from inventory import Inventory
+from risk import score_device
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_ADB = os.path.join(HERE, "fake_adb.py")
+
+# Packages every benchmark device has besides the synthetic ones.
+JUNK = "com.speed.booster.cleaner"
+NOTES = "org.example.notes"
+
+
+def write_scenario(path, packages, delay=0.0):
+    """Write a one-device fake_adb scenario with packages synthetic apps."""
+    scenario = {
+        "devices": {
+            "BENCH0001": {
+                "packages": {
+                    JUNK: {
+                        "installer": None,
+                        "granted": ["android.permission.READ_SMS"],
+                    },
+                    NOTES: {"installer": "com.android.vending"},
+                },
+                "overlay": [JUNK],
+                "synthetic": packages,
+                "delay": delay,
+            }
+        }
+    }
+    with open(path, "w") as f:
+        json.dump(scenario, f)
+
+
+def _check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def run_benchmark(work, packages=200, chunk=25, delay=0.0):
+    """Drive list_user_apps, score_device and run_bulk through fake_adb.
+
+    Every step checks its result against the scenario, so this doubles as
+    a smoke test. Returns [{"step", "seconds", "items"}].
+    """
+    scenario = os.path.join(work, "scenario.json")
+    write_scenario(scenario, packages, delay)
+    os.environ["FAKE_ADB_SCENARIO"] = scenario
+    os.environ["FAKE_ADB_STATE"] = os.path.join(work, "state.json")
+    synthetic = [f"com.synthetic.app{n}" for n in range(packages)]
+    total = packages + 2
+
+    results = []
+
+    def step(name, items, func):
+        start = time.perf_counter()
+        value = func()
+        results.append(
+            {"step": name, "seconds": time.perf_counter() - start, "items": items}
+        )
+        return value
+
+    def list_apps():
+        # The menu prints every app; only the returned names matter here
+        with contextlib.redirect_stdout(io.StringIO()):
+            return helper.list_user_apps()
+
+    helper._session = AdbShell(adb=FAKE_ADB)
+    helper._inventory = Inventory(":memory:")
+    helper._serial = None
+    try:
+        listed = step("list_user_apps", total, list_apps)
+        _check(len(listed) == total, f"listed {len(listed)} of {total} apps")
+        listed = step("list_user_apps (cached)", total, list_apps)
+        _check(len(listed) == total, "cached listing differs")
+
+        shell = helper._session.shell
+        table = step("score_device", total, lambda: score_device(shell))
+        _check(len(table) == total, f"scored {len(table)} of {total} apps")
+        _check(table[0].package == JUNK, f"{table[0].package} ranked riskiest")
+
+        half = len(synthetic) // 2
+        disable, uninstall = synthetic[:half], synthetic[half:] + [JUNK]
+        done = step(
+            "run_bulk disable",
+            len(disable),
+            lambda: list(run_bulk("disable", disable, shell, chunk)),
+        )
+        _check(all(r.ok for r in done), "a disable failed")
+        done = step(
+            "run_bulk uninstall",
+            len(uninstall) + 1,
+            lambda: list(
+                run_bulk("uninstall", uninstall + ["com.not.installed"], shell, chunk)
+            ),
+        )
+        _check(all(r.ok for r in done[:-1]), "an uninstall failed")
+        _check(not done[-1].ok, "uninstalling a missing package succeeded")
+
+        helper._inventory.invalidate(helper.device_serial())
+        listed = list_apps()
+        _check(
+            sorted(listed) == sorted(disable + [NOTES]),
+            "uninstalled apps are still listed",
+        )
+    finally:
+        helper._session.close()
+        helper._inventory.close()
+        helper._session = helper._inventory = helper._serial = None
+    return results
+
+
+def print_results(results):
+    print(f"\n{'Step':<26}{'Seconds':>10}{'Items':>8}{'Items/s':>10}")
+    for r in results:
+        rate = r["items"] / r["seconds"] if r["seconds"] else 0.0
+        print(f"{r['step']:<26}{r['seconds']:>10.3f}{r['items']:>8}{rate:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark ADBShellHelper against fake_adb.py."
+    )
+    parser.add_argument("--packages", type=int, default=200)
+    parser.add_argument("--chunk", type=int, default=25)
+    parser.add_argument(
+        "--delay", type=float, default=0.0, help="seconds per adb call (slow link)"
+    )
+    parser.add_argument("--json", metavar="PATH", help="also write results here")
+    args = parser.parse_args()
+    if args.packages < 2:
+        parser.error("--packages must be at least 2")
+    if args.chunk < 1:
+        parser.error("--chunk must be at least 1")
+
+    work = tempfile.mkdtemp(prefix="fakeadb-")
+    try:
+        results = run_benchmark(work, args.packages, args.chunk, args.delay)
+    finally:
+        shutil.rmtree(work)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
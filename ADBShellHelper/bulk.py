@@ -0,0 +1,171 @@
+import argparse
+import json
+import re
+import sys
+from collections import namedtuple
+
+from adb_session import AdbShell
+from inventory import Inventory
+
+# Device command per package, and the text its output has on success.
+ACTIONS = {
+    "uninstall": ("pm uninstall {package}", "Success"),
+    "disable": ("pm disable-user --user 0 {package}", "new state: disabled"),
+}
+
+# Packages sent to the device per shell command.
+DEFAULT_CHUNK = 25
+
+_MARKER = "__BULK_PKG__"
+
+_PACKAGE_NAME_RE = re.compile(r"^[A-Za-z][\w]*(\.[\w]+)+$")
+
+BulkResult = namedtuple("BulkResult", "package ok message")
+
+
+def read_packages(sources):
+    """Package names from names and/or files of names (one per line).
+
+    Blank lines and "#" comments are skipped; duplicates keep their first
+    position. Raises ValueError for anything that isn't a package name.
+    """
+    packages = []
+    for source in sources:
+        if _PACKAGE_NAME_RE.match(source):
+            lines = [source]
+        else:
+            with open(source) as f:
+                lines = f.read().splitlines()
+        for line in lines:
+            name = line.split("#", 1)[0].strip()
+            if not name:
+                continue
+            if not _PACKAGE_NAME_RE.match(name):
+                raise ValueError(f"Not a package name: {name!r} (in {source})")
+            if name not in packages:
+                packages.append(name)
+    return packages
+
+
+def build_command(action, packages):
+    """One device command running action on every package, each output
+    preceded by a marker line naming the package."""
+    template, _ = ACTIONS[action]
+    return "; ".join(
+        f"echo {_MARKER} {pkg}; {template.format(package=pkg)} 2>&1"
+        for pkg in packages
+    )
+
+
+def parse_output(action, packages, output):
+    """Split the output of build_command into one BulkResult per package.
+
+    A package whose marker never shows up (the command was cut short)
+    counts as failed.
+    """
+    _, success = ACTIONS[action]
+    outputs = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith(_MARKER):
+            current = line[len(_MARKER) :].strip()
+            outputs[current] = []
+        elif current is not None:
+            outputs[current].append(line.strip())
+    results = []
+    for pkg in packages:
+        if pkg not in outputs:
+            results.append(BulkResult(pkg, False, "no output from device"))
+            continue
+        message = " ".join(line for line in outputs[pkg] if line)
+        results.append(BulkResult(pkg, success in message, message))
+    return results
+
+
+def run_bulk(action, packages, shell, chunk=DEFAULT_CHUNK):
+    """Run action on packages over one shell session, chunk packages at a time.
+
+    shell(command, timeout) runs one device command and returns its output
+    (AdbShell.shell). Yields a BulkResult per package as each chunk
+    finishes; a chunk that fails marks all its packages as failed and the
+    run goes on with the next one.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown bulk action: {action}")
+    for start in range(0, len(packages), chunk):
+        batch = packages[start : start + chunk]
+        try:
+            output = shell(build_command(action, batch), timeout=30 + 5 * len(batch))
+        except (TimeoutError, ConnectionError) as e:
+            for pkg in batch:
+                yield BulkResult(pkg, False, str(e))
+            continue
+        yield from parse_output(action, batch, output)
+
+
+def print_results(results):
+    print(f"\n{'Status':<8}Package")
+    for r in results:
+        status = "ok" if r.ok else "FAILED"
+        print(f"{status:<8}{r.package}  {r.message}")
+    failed = sum(not r.ok for r in results)
+    print(f"\n{len(results) - failed} succeeded, {failed} failed.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Uninstall or disable many packages over one adb shell session."
+    )
+    parser.add_argument("action", choices=sorted(ACTIONS))
+    parser.add_argument(
+        "packages",
+        nargs="+",
+        help="package names, or files listing one package per line",
+    )
+    parser.add_argument("-s", "--serial", help="device serial")
+    parser.add_argument(
+        "--chunk",
+        type=int,
+        default=DEFAULT_CHUNK,
+        help=f"packages per device command (default {DEFAULT_CHUNK})",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="print the commands without running"
+    )
+    parser.add_argument("--json", metavar="PATH", help="also write results here")
+    args = parser.parse_args(argv)
+    if args.chunk < 1:
+        parser.error("--chunk must be at least 1")
+
+    try:
+        packages = read_packages(args.packages)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    if not packages:
+        print("No packages given.")
+        return 1
+
+    if args.dry_run:
+        for start in range(0, len(packages), args.chunk):
+            print(build_command(args.action, packages[start : start + args.chunk]))
+        return 0
+
+    with AdbShell(args.serial) as session:
+        results = list(run_bulk(args.action, packages, session.shell, args.chunk))
+        if any(r.ok for r in results):
+            try:
+                serial = args.serial or session.shell("getprop ro.serialno")
+                with Inventory() as inventory:
+                    inventory.invalidate(serial)
+            except Exception as e:
+                print(f"Error: {e}")
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([r._asdict() for r in results], f, indent=2)
+    return 0 if all(r.ok for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""Stand-in for the adb executable, backed by scripted devices.
+
+Run ADBShellHelper with ADB=/path/to/fake_adb.py (or put it on PATH as
+"adb") to test or benchmark it without a phone. Devices come from a JSON
+scenario (FAKE_ADB_SCENARIO, or the built-in SCENARIO below) and their
+state, such as uninstalled or disabled packages, is kept in
+FAKE_ADB_STATE so it survives between adb calls. The state is rebuilt
+from the scenario when the scenario changes, and `fake_adb.py --reset`
+starts it afresh, e.g. at the start of each test session.
+
+The built-in scenario has one device, so plain `adb shell` works. With a
+scenario of several devices pick one with -s or ANDROID_SERIAL, as with
+the real adb; fleet.py passes -s itself.
+
+`adb shell` runs a real /bin/sh whose PATH starts with small wrappers for
+pm, dumpsys, appops, getprop and am, so pipes, quoting and the session's
+sentinel framing behave as on a device. POSIX only.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+SCENARIO = {
+    "devices": {
+        "FAKE0001": {
+            "packages": {
+                "com.speed.booster.cleaner": {
+                    "version_code": 42,
+                    "version_name": "4.2",
+                    "installer": None,
+                    "granted": [
+                        "android.permission.READ_SMS",
+                        "android.permission.RECEIVE_BOOT_COMPLETED",
+                    ],
+                },
+                "org.example.notes": {
+                    "version_code": 7,
+                    "version_name": "0.7",
+                    "installer": "com.android.vending",
+                    "granted": ["android.permission.INTERNET"],
+                },
+                "com.flashlight.free": {
+                    "version_code": 3,
+                    "version_name": "1.0.3",
+                    "installer": "com.android.vending",
+                    "granted": ["android.permission.CAMERA"],
+                },
+            },
+            "overlay": ["com.speed.booster.cleaner"],
+            "notifications": ["com.speed.booster.cleaner", "org.example.notes"],
+            "focus": [
+                [0.0, "com.android.launcher3/.Launcher"],
+                [0.5, "org.example.notes/.MainActivity"],
+                [1.0, "com.android.launcher3/.Launcher"],
+            ],
+            # Extra generated packages (com.synthetic.appN) for benchmarks
+            "synthetic": 0,
+            # Seconds every adb call takes, to mimic a slow link
+            "delay": 0.0,
+        },
+    }
+}
+
+DEVICE_TOOLS = ("pm", "dumpsys", "appops", "getprop", "am")
+
+
+def _state_path():
+    return os.environ.get(
+        "FAKE_ADB_STATE", os.path.join(tempfile.gettempdir(), "fake_adb_state.json")
+    )
+
+
+def _load_scenario():
+    path = os.environ.get("FAKE_ADB_SCENARIO")
+    if not path:
+        return json.loads(json.dumps(SCENARIO))
+    with open(path) as f:
+        return json.load(f)
+
+
+def _scenario_key():
+    """Identifies the scenario in use; the state is rebuilt when it changes."""
+    path = os.environ.get("FAKE_ADB_SCENARIO")
+    if not path:
+        text = json.dumps(SCENARIO, sort_keys=True).encode()
+        return "builtin:" + hashlib.sha1(text).hexdigest()
+    path = os.path.abspath(path)
+    return f"{path}:{os.stat(path).st_mtime_ns}"
+
+
+def _expand(scenario):
+    """Fill in package defaults and generated packages."""
+    for serial, device in scenario["devices"].items():
+        packages = device.setdefault("packages", {})
+        for n in range(device.get("synthetic", 0)):
+            packages.setdefault(
+                f"com.synthetic.app{n}",
+                {"version_code": n + 1, "installer": "com.android.vending"},
+            )
+        for uid, (name, info) in enumerate(sorted(packages.items()), 10100):
+            info.setdefault("version_code", 1)
+            info.setdefault("version_name", str(info["version_code"]))
+            info.setdefault("installer", "com.android.vending")
+            info.setdefault("uid", uid)
+            info.setdefault("first_install", "2024-01-01 12:00:00")
+            info.setdefault("last_update", info["first_install"])
+            info.setdefault("granted", [])
+            info.setdefault("enabled", True)
+    return scenario
+
+
+@contextmanager
+def device_state():
+    """Yield the mutable state of all devices, saved back on exit."""
+    path = _state_path()
+    key = _scenario_key()
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        state = None
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+        if state is None or state.get("scenario") != key:
+            state = _expand(_load_scenario())
+            state["scenario"] = key
+        yield state
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+
+def _pm(device, args, serial):
+    if args[:2] == ["list", "packages"]:
+        third_party = "-3" in args
+        for name, info in sorted(device["packages"].items()):
+            if third_party and info.get("system"):
+                continue
+            print(f"package:{name}")
+        return 0
+    if args and args[0] in ("uninstall", "disable-user", "enable"):
+        name = args[-1]
+        info = device["packages"].get(name)
+        if info is None:
+            if args[0] == "uninstall":
+                print("Failure [DELETE_FAILED_INTERNAL_ERROR]")
+            else:
+                print(f"Error: Unknown package: {name}")
+            return 1
+        if args[0] == "uninstall":
+            del device["packages"][name]
+            print("Success")
+        else:
+            info["enabled"] = args[0] == "enable"
+            new_state = "enabled" if info["enabled"] else "disabled-user"
+            print(f"Package {name} new state: {new_state}")
+        return 0
+    print(f"fake pm: unsupported: {' '.join(args)}", file=sys.stderr)
+    return 1
+
+
+def _dumpsys(device, args, serial):
+    if args[:2] == ["package", "packages"]:
+        print("Database versions:\n  Internal:\n    sdkVersion=34\n\nPackages:")
+        for name, info in sorted(device["packages"].items()):
+            print(f"  Package [{name}] ({abs(hash(name)) % 0xFFFFFFF:x}):")
+            print(f"    userId={info['uid']}")
+            print(f"    versionCode={info['version_code']} minSdk=21 targetSdk=34")
+            print(f"    versionName={info['version_name']}")
+            print(f"    firstInstallTime={info['first_install']}")
+            print(f"    lastUpdateTime={info['last_update']}")
+            print(f"    installerPackageName={info['installer'] or 'null'}")
+            print("    requested permissions:")
+            for permission in info["granted"]:
+                print(f"      {permission}")
+            print(f"    User 0: installed=true enabled={int(info['enabled'])}")
+            print("      runtime permissions:")
+            for permission in info["granted"]:
+                print(f"        {permission}: granted=true, flags=[ USER_SET ]")
+        print("\nHidden system packages:")
+        return 0
+    if args[:2] == ["window", "windows"]:
+        focus = device.get("focus") or [[0, "com.android.launcher3/.Launcher"]]
+        print(f"  mCurrentFocus=Window{{1a2b3c u0 {focus[-1][1]}}}")
+        return 0
+    print(f"fake dumpsys: unsupported: {' '.join(args)}", file=sys.stderr)
+    return 1
+
+
+def _appops(device, args, serial):
+    if args[:1] == ["query-op"] and len(args) > 1:
+        key = {"SYSTEM_ALERT_WINDOW": "overlay", "POST_NOTIFICATION": "notifications"}
+        for name in device.get(key.get(args[1], ""), []):
+            if name in device["packages"]:
+                print(name)
+        return 0
+    print(f"fake appops: unsupported: {' '.join(args)}", file=sys.stderr)
+    return 1
+
+
+def _getprop(device, args, serial):
+    print(serial if args == ["ro.serialno"] else "")
+    return 0
+
+
+def _am(device, args, serial):
+    print(f"fake am: unsupported: {' '.join(args)}", file=sys.stderr)
+    return 1
+
+
+def device_tool(tool, args, serial):
+    """Run one emulated device command; returns its exit status."""
+    with device_state() as state:
+        device = state["devices"][serial]
+        return globals()[f"_{tool}"](device, args, serial)
+
+
+def _tool_dir():
+    """A folder of pm/dumpsys/... wrappers that call back into this script."""
+    folder = _state_path() + ".bin"
+    os.makedirs(folder, exist_ok=True)
+    script = os.path.abspath(__file__)
+    for tool in DEVICE_TOOLS:
+        path = os.path.join(folder, tool)
+        if not os.path.exists(path):
+            with open(path, "w") as f:
+                f.write(
+                    f'#!/bin/sh\nexec "{sys.executable}" "{script}" '
+                    f'--device-tool {tool} "$@"\n'
+                )
+            os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return folder
+
+
+def _shell(serial, args):
+    env = dict(os.environ)
+    env["FAKE_ADB_SERIAL"] = serial
+    env["PATH"] = _tool_dir() + os.pathsep + env.get("PATH", "")
+    argv = ["/bin/sh"] + (["-c", " ".join(args)] if args else [])
+    return subprocess.call(argv, env=env)
+
+
+def _logcat(device):
+    """Print the scripted focus events, then wait like a live logcat."""
+    start = time.time()
+    for delay, component in device.get("focus", []):
+        time.sleep(max(0.0, start + delay - time.time()))
+        print(
+            f"{time.time():.3f}  1000  1200 I wm_set_resumed_activity: "
+            f"[0,{component},startActivity]",
+            flush=True,
+        )
+    while True:
+        time.sleep(3600)
+
+
+def reset():
+    """Forget the device state, so the next call starts from the scenario."""
+    path = _state_path()
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def main(argv):
+    if argv[:1] == ["--device-tool"]:
+        return device_tool(argv[1], argv[2:], os.environ["FAKE_ADB_SERIAL"])
+    if argv[:1] == ["--reset"]:
+        reset()
+        argv = argv[1:]
+        if not argv:
+            return 0
+
+    with device_state() as state:
+        devices = state["devices"]
+    # Like adb, -s wins over ANDROID_SERIAL
+    serial = os.environ.get("ANDROID_SERIAL")
+    if argv[:1] == ["-s"]:
+        serial, argv = argv[1], argv[2:]
+    if argv[:1] == ["devices"]:
+        print("List of devices attached")
+        for name in devices:
+            print(f"{name}\tdevice")
+        return 0
+
+    if serial is None:
+        if len(devices) != 1:
+            print("adb: more than one device/emulator", file=sys.stderr)
+            return 1
+        serial = next(iter(devices))
+    if serial not in devices:
+        print(f"adb: device '{serial}' not found", file=sys.stderr)
+        return 1
+    time.sleep(devices[serial].get("delay", 0.0))
+
+    if argv[:1] == ["shell"]:
+        return _shell(serial, argv[1:])
+    if argv[:1] == ["uninstall"] and len(argv) > 1:
+        return device_tool("pm", ["uninstall", argv[-1]], serial)
+    if argv[:1] == ["logcat"]:
+        return _logcat(devices[serial])
+    print(f"fake adb: unsupported: {' '.join(argv)}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
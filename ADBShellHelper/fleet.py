@@ -0,0 +1,220 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+
+from main import ADB, SUSPICIOUS_MATCHER
+from risk import RISK_COMMAND, RISK_THRESHOLD, score_output
+
+# adb arguments (after "-s SERIAL") for each read-only fleet operation.
+QUERIES = {
+    "apps": ["shell", "pm list packages -3"],
+    "overlay": ["shell", "appops query-op SYSTEM_ALERT_WINDOW --user 0"],
+    "notifications": ["shell", "appops query-op POST_NOTIFICATION --user 0"],
+    "risk": ["shell", RISK_COMMAND],
+}
+OPERATIONS = sorted(QUERIES) + ["uninstall"]
+
+# Devices worked on at once. High enough that a fleet of dozens runs in one
+# wave; it only bounds the adb processes (and file handles) open together.
+DEFAULT_CONCURRENCY = 64
+
+
+async def run_adb_async(args, serial=None, timeout=30, adb=ADB):
+    """Run one adb command without blocking the event loop.
+
+    Returns (returncode, output). Raises asyncio.TimeoutError after timeout
+    seconds, once the adb process has been killed.
+    """
+    argv = [adb] + (["-s", serial] if serial else []) + list(args)
+    proc = await asyncio.create_subprocess_exec(
+        *argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    try:
+        out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    return proc.returncode, out.decode(errors="replace").strip()
+
+
+async def list_devices(adb=ADB):
+    """Return the serials `adb devices` reports as ready ("device" state)."""
+    _, output = await run_adb_async(["devices"], adb=adb)
+    serials = []
+    for line in output.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) >= 2 and fields[1] == "device":
+            serials.append(fields[0])
+    return serials
+
+
+def parse_packages(output):
+    """Package names from `pm list packages` or `appops query-op` output."""
+    return [
+        line.strip().replace("package:", "")
+        for line in output.splitlines()
+        if line.strip()
+    ]
+
+
+def is_suspicious(pkg):
+    return bool(SUSPICIOUS_MATCHER.find(pkg))
+
+
+async def _device_job(serial, operation, package, timeout, adb):
+    args = ["uninstall", package] if operation == "uninstall" else QUERIES[operation]
+    start = time.perf_counter()
+    try:
+        code, output = await run_adb_async(args, serial, timeout, adb)
+    except asyncio.TimeoutError:
+        return {
+            "serial": serial,
+            "ok": False,
+            "error": f"timed out after {timeout}s",
+            "seconds": time.perf_counter() - start,
+        }
+    except OSError as e:
+        return {
+            "serial": serial,
+            "ok": False,
+            "error": str(e),
+            "seconds": time.perf_counter() - start,
+        }
+
+    result = {"serial": serial, "seconds": time.perf_counter() - start}
+    if operation == "uninstall":
+        result["ok"] = code == 0 and "Success" in output
+        result["output"] = output
+    else:
+        result["ok"] = code == 0
+        if not result["ok"]:
+            result["error"] = output
+        elif operation == "risk":
+            table = score_output(output)
+            result["risk"] = [entry._asdict() for entry in table]
+            # Only flagged apps count towards the fleet summary
+            result["packages"] = [
+                entry.package for entry in table if entry.score >= RISK_THRESHOLD
+            ]
+        else:
+            result["packages"] = parse_packages(output)
+    return result
+
+
+async def run_fleet(
+    operation,
+    serials=None,
+    package=None,
+    concurrency=DEFAULT_CONCURRENCY,
+    timeout=30,
+    adb=ADB,
+):
+    """Run operation on every device at once, at most `concurrency` at a time.
+
+    serials defaults to every ready device from `adb devices`. Returns one
+    result dict per device, in serial order; a device that fails or times
+    out only affects its own entry.
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown fleet operation: {operation}")
+    if operation == "uninstall" and not package:
+        raise ValueError("uninstall needs a package name")
+    if serials is None:
+        serials = await list_devices(adb)
+
+    limit = asyncio.Semaphore(concurrency)
+
+    async def job(serial):
+        async with limit:
+            return await _device_job(serial, operation, package, timeout, adb)
+
+    return list(await asyncio.gather(*(job(serial) for serial in sorted(serials))))
+
+
+def fleet(operation, serials=None, **options):
+    """Blocking wrapper around run_fleet."""
+    return asyncio.run(run_fleet(operation, serials, **options))
+
+
+def summarize(results):
+    """Aggregate per-device package lists: {package: number of devices}."""
+    counts = Counter()
+    for result in results:
+        counts.update(set(result.get("packages", ())))
+    return counts
+
+
+def print_fleet_report(operation, results, top=20):
+    print(f"\n{'Serial':<24}{'Status':<10}{'Seconds':>8}  Details")
+    for r in results:
+        if not r["ok"]:
+            details = r.get("error") or r.get("output", "")
+        elif "packages" in r:
+            details = f"{len(r['packages'])} packages"
+        else:
+            details = r.get("output", "")
+        status = "ok" if r["ok"] else "FAILED"
+        print(f"{r['serial']:<24}{status:<10}{r['seconds']:>8.2f}  {details}")
+
+    counts = summarize(results)
+    if counts:
+        print(f"\nMost common packages ({operation}):")
+        for pkg, n in counts.most_common(top):
+            flag = "  <-- Suspicious" if is_suspicious(pkg) else ""
+            print(f"{n:>5}  {pkg}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run an ADBShellHelper operation on every connected device."
+    )
+    parser.add_argument("operation", choices=OPERATIONS)
+    parser.add_argument(
+        "-s",
+        "--serial",
+        action="append",
+        help="device serial (repeatable; default: all from `adb devices`)",
+    )
+    parser.add_argument("--package", help="package to uninstall")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="devices worked on at once; larger fleets run in waves of this "
+        f"many (default {DEFAULT_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=30, help="seconds allowed per device"
+    )
+    parser.add_argument("--json", metavar="PATH", help="also write results here")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    try:
+        results = fleet(
+            args.operation,
+            args.serial,
+            package=args.package,
+            concurrency=args.concurrency,
+            timeout=args.timeout,
+        )
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    if not results:
+        print("No devices found.")
+        return 1
+
+    print_fleet_report(args.operation, results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
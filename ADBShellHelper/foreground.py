@@ -0,0 +1,140 @@
+import re
+import subprocess
+import threading
+import time
+from collections import Counter, namedtuple
+
+# Event-log tags written when an activity comes to the front, newest
+# Android versions first.
+FOCUS_TAGS = (
+    "wm_set_resumed_activity",
+    "am_set_resumed_activity",
+    "am_resume_activity",
+    "am_focused_activity",
+)
+
+# `logcat -v epoch` event line: "<secs.millis> <pid> <tid> <level> <tag>: [..]"
+EVENT_RE = re.compile(
+    r"^\s*(?P<time>\d+\.\d+)\s+\d+\s+\d+\s+\w\s+"
+    r"(?P<tag>\w+)\s*:\s*\[(?P<fields>.*)\]"
+)
+
+Transition = namedtuple("Transition", "time previous package component")
+
+
+def parse_event(line):
+    """Return (timestamp, package, component) for a focus event line, or None."""
+    m = EVENT_RE.match(line)
+    if m is None or m.group("tag") not in FOCUS_TAGS:
+        return None
+    for field in m.group("fields").split(","):
+        field = field.strip()
+        if "/" in field:
+            return float(m.group("time")), field.split("/", 1)[0], field
+    return None
+
+
+class ForegroundTracker:
+    """Follows the foreground app from one long-running logcat stream.
+
+    Instead of polling dumpsys, it reads the focus events the activity
+    manager writes to the events log buffer, so it gets a timestamped
+    event the moment an app is resumed and costs nothing in between. Time
+    spent in each app is added up in dwell.
+    """
+
+    def __init__(self, serial=None, adb="adb"):
+        self.serial = serial
+        self.adb = adb
+        self.current = None
+        self.since = None
+        self.dwell = Counter()
+        self.transitions = []
+        # Device time of the last event, and host clock when it arrived
+        self._last_device = None
+        self._last_host = None
+        # The first event may be old (-T 1 replays it); the app it names is
+        # only credited from when tracking started
+        self._started = None
+        self._initial = True
+
+    def _argv(self):
+        argv = [self.adb]
+        if self.serial:
+            argv += ["-s", self.serial]
+        # -T 1 starts at the newest entry: the app in front right now
+        filters = [f"{tag}:I" for tag in FOCUS_TAGS] + ["*:S"]
+        logcat = ["logcat", "-b", "events", "-v", "epoch", "-T", "1"]
+        return argv + logcat + filters
+
+    def feed(self, timestamp, package, component):
+        """Account one focus event; returns a Transition if the app changed."""
+        self._last_device = timestamp
+        self._last_host = time.monotonic()
+        if self._started is None:
+            self._started = self._last_host
+        if package == self.current:
+            return None
+        if self.current is not None:
+            self._credit(timestamp)
+        transition = Transition(timestamp, self.current, package, component)
+        self.transitions.append(transition)
+        self._initial = self.current is None
+        self.current, self.since = package, timestamp
+        return transition
+
+    def _credit(self, until):
+        seconds = max(0.0, until - self.since)
+        if self._initial:
+            seconds = min(seconds, time.monotonic() - self._started)
+        self.dwell[self.current] += seconds
+
+    def events(self, lines):
+        """Yield a Transition for every change of app in logcat lines."""
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode(errors="replace")
+            event = parse_event(line)
+            if event is not None:
+                transition = self.feed(*event)
+                if transition is not None:
+                    yield transition
+
+    def stream(self, duration=None):
+        """Run logcat and yield Transitions, for duration seconds or forever."""
+        proc = subprocess.Popen(
+            self._argv(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        self._started = time.monotonic()
+        timer = None
+        if duration is not None:
+            timer = threading.Timer(duration, proc.terminate)
+            timer.start()
+        try:
+            yield from self.events(proc.stdout)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if proc.poll() is None:
+                proc.terminate()
+            proc.wait()
+            self.finish()
+
+    def finish(self):
+        """Credit the app still in front with its time up to now."""
+        if self.current is None:
+            return
+        now = self._last_device + (time.monotonic() - self._last_host)
+        self._credit(now)
+        self.since = now
+
+    def report(self):
+        """(package, seconds) pairs, longest dwell first."""
+        return self.dwell.most_common()
+
+
+def format_transition(t):
+    clock = time.strftime("%H:%M:%S", time.localtime(t.time))
+    millis = round(t.time * 1000) % 1000
+    previous = t.previous or "-"
+    return f"{clock}.{millis:03d}  {previous} -> {t.package}  ({t.component})"
@@ -0,0 +1,261 @@
+import os
+import re
+import sqlite3
+import time
+from collections import namedtuple
+
+# Snapshots younger than this many seconds are served from the store.
+DEFAULT_TTL = 300
+
+_SPLIT = "__INVENTORY_SPLIT__"
+
+# One device round-trip: the user package names, then every package's details.
+SNAPSHOT_COMMAND = f"pm list packages -3; echo {_SPLIT}; dumpsys package packages"
+
+PackageInfo = namedtuple(
+    "PackageInfo",
+    "name version_code version_name installer uid first_install last_update",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    serial TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    stale INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS packages (
+    snapshot INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    version_code INTEGER,
+    version_name TEXT,
+    installer TEXT,
+    uid INTEGER,
+    first_install TEXT,
+    last_update TEXT,
+    PRIMARY KEY (snapshot, name)
+);
+CREATE INDEX IF NOT EXISTS snapshots_serial ON snapshots (serial, id);
+"""
+
+_PACKAGE_RE = re.compile(r"^\s*Package \[([^\]]+)\]")
+_PERMISSION_RE = re.compile(r"^([\w.]+)(?::\s*granted=(true|false))?")
+
+# Sub-sections of a package block that list permissions.
+_PERMISSION_SECTIONS = {
+    "requested permissions": "requested",
+    "install permissions": "granted",
+    "runtime permissions": "granted",
+}
+_FIELD_RE = re.compile(
+    r"\b(userId|versionCode|versionName|firstInstallTime|lastUpdateTime"
+    r"|installerPackageName)=(\S+(?: \d\d:\d\d:\d\d)?)"
+)
+
+
+def parse_package_list(output):
+    """Package names from `pm list packages` output."""
+    return [
+        line.strip()[len("package:") :]
+        for line in output.splitlines()
+        if line.strip().startswith("package:")
+    ]
+
+
+def parse_dumpsys_packages(output):
+    """Map package name -> {field: value} from `dumpsys package packages`.
+
+    One pass over the lines; only the "Packages:" section is read, so the
+    hidden system packages listed after it don't overwrite the real ones.
+    Besides the plain fields, "requested" holds the set of requested
+    permissions and "granted" the install and runtime permissions granted.
+    """
+    packages = {}
+    current = None
+    in_section = False
+    permissions = None
+    for line in output.splitlines():
+        if line and not line[0].isspace():
+            in_section = line.startswith("Packages:")
+            current = None
+            continue
+        if not in_section:
+            continue
+        m = _PACKAGE_RE.match(line)
+        if m:
+            current = packages.setdefault(
+                m.group(1), {"requested": set(), "granted": set()}
+            )
+            permissions = None
+            continue
+        if current is None:
+            continue
+        stripped = line.strip()
+        if stripped.endswith(":") and "=" not in stripped:
+            permissions = _PERMISSION_SECTIONS.get(stripped[:-1])
+            continue
+        if permissions is not None:
+            p = _PERMISSION_RE.match(stripped)
+            if p and "." in p.group(1):
+                if permissions == "requested":
+                    current["requested"].add(p.group(1))
+                elif p.group(2) == "true":
+                    current["granted"].add(p.group(1))
+                continue
+            permissions = None
+        if "=" in line:
+            for key, value in _FIELD_RE.findall(line):
+                current.setdefault(key, value)
+    return packages
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def take_snapshot(shell):
+    """Collect the user packages of a device with one shell call.
+
+    shell(command) runs a command on the device and returns its output.
+    Returns {name: PackageInfo}.
+    """
+    output = shell(SNAPSHOT_COMMAND)
+    names_part, _, details_part = output.partition(_SPLIT)
+    details = parse_dumpsys_packages(details_part)
+    snapshot = {}
+    for name in parse_package_list(names_part):
+        d = details.get(name, {})
+        installer = d.get("installerPackageName")
+        snapshot[name] = PackageInfo(
+            name,
+            _int(d.get("versionCode")),
+            d.get("versionName"),
+            None if installer == "null" else installer,
+            _int(d.get("userId")),
+            d.get("firstInstallTime"),
+            d.get("lastUpdateTime"),
+        )
+    return snapshot
+
+
+class Inventory:
+    """Per-device package snapshots kept in SQLite.
+
+    get() returns the latest snapshot of a device while it is younger than
+    ttl seconds, and only asks the device again after that (or when the
+    device's snapshot was invalidated, e.g. after an uninstall).
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        path = self.default_path() if path is None else path
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.ttl = ttl
+        self._cache = {}
+
+    @staticmethod
+    def default_path():
+        cache = os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(cache, "adbshellhelper.sqlite")
+
+    def latest(self, serial, count=1):
+        """Return (id, taken_at, stale) of the newest snapshots, newest first."""
+        return self.conn.execute(
+            "SELECT id, taken_at, stale FROM snapshots WHERE serial = ? "
+            "ORDER BY id DESC LIMIT ?",
+            (serial, count),
+        ).fetchall()
+
+    def load(self, snapshot_id):
+        """Return {name: PackageInfo} for a stored snapshot."""
+        if snapshot_id not in self._cache:
+            rows = self.conn.execute(
+                "SELECT name, version_code, version_name, installer, uid, "
+                "first_install, last_update FROM packages WHERE snapshot = ?",
+                (snapshot_id,),
+            )
+            self._cache[snapshot_id] = {row[0]: PackageInfo(*row) for row in rows}
+        return self._cache[snapshot_id]
+
+    def record(self, serial, packages):
+        """Store a snapshot and return its id."""
+        with self.conn:
+            snapshot_id = self.conn.execute(
+                "INSERT INTO snapshots (serial, taken_at) VALUES (?, ?)",
+                (serial, time.time()),
+            ).lastrowid
+            self.conn.executemany(
+                "INSERT INTO packages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(snapshot_id, *info) for info in packages.values()],
+            )
+        self._cache[snapshot_id] = dict(packages)
+        return snapshot_id
+
+    def get(self, serial, shell, force=False):
+        """Return (snapshot_id, {name: PackageInfo}) for a device.
+
+        Uses the latest stored snapshot unless it is older than ttl or
+        force is set, in which case shell is used to take a new one.
+        """
+        latest = self.latest(serial)
+        if latest and not force:
+            snapshot_id, taken_at, stale = latest[0]
+            if not stale and time.time() - taken_at < self.ttl:
+                return snapshot_id, self.load(snapshot_id)
+        snapshot_id = self.record(serial, take_snapshot(shell))
+        return snapshot_id, self.load(snapshot_id)
+
+    def invalidate(self, serial):
+        """Make the next get() for serial ask the device again."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE snapshots SET stale = 1 WHERE serial = ? AND stale = 0",
+                (serial,),
+            )
+
+    def diff(self, old_id, new_id):
+        """Compare two snapshots.
+
+        Returns {"installed": [PackageInfo], "removed": [PackageInfo],
+        "updated": [(old, new)]}; an app counts as updated when its
+        version code or last update time changed.
+        """
+        old, new = self.load(old_id), self.load(new_id)
+        return {
+            "installed": [new[name] for name in sorted(new.keys() - old.keys())],
+            "removed": [old[name] for name in sorted(old.keys() - new.keys())],
+            "updated": [
+                (old[name], new[name])
+                for name in sorted(old.keys() & new.keys())
+                if (old[name].version_code, old[name].last_update)
+                != (new[name].version_code, new[name].last_update)
+            ],
+        }
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def print_diff(diff):
+    for info in diff["installed"]:
+        print(f"[+] {info.name} {info.version_name or ''} ({info.installer or '?'})")
+    for info in diff["removed"]:
+        print(f"[-] {info.name} {info.version_name or ''}")
+    for old, new in diff["updated"]:
+        print(
+            f"[*] {new.name} {old.version_name} ({old.version_code}) -> "
+            f"{new.version_name} ({new.version_code})"
+        )
+    if not any(diff.values()):
+        print("No changes.")
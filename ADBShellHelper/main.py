@@ -2,6 +2,12 @@ import subprocess
 import time
 import re
 
+from adb_session import ADB, AdbShell
+from bulk import print_results, run_bulk
+from foreground import ForegroundTracker, format_transition
+from inventory import Inventory, print_diff
+from risk import KeywordMatcher, print_risk_table, score_device
+
 # List of keywords commonly found in adware/junk apps
 SUSPICIOUS_KEYWORDS = [
     "clean",
@@ -13,26 +19,85 @@ SUSPICIOUS_KEYWORDS = [
     "master",
 ]
 
+SUSPICIOUS_MATCHER = KeywordMatcher(SUSPICIOUS_KEYWORDS)
+
 
 def run_adb(command):
     """Run an ADB command and return output."""
     try:
         result = subprocess.run(
-            ["adb"] + command.split(), capture_output=True, text=True
+            [ADB] + command.split(), capture_output=True, text=True
         )
         return result.stdout.strip()
     except Exception as e:
         return f"Error: {e}"
 
 
+_session = None
+
+
+def get_session():
+    """Return the shared adb shell session, starting it on first use."""
+    global _session
+    if _session is None:
+        _session = AdbShell()
+    return _session
+
+
+def run_shell(command):
+    """Run a shell command on the device over the shared adb shell session.
+
+    Unlike run_adb, the command line goes to the device shell as is, so
+    pipes and quoting work, and no new adb process is started per call.
+    """
+    try:
+        return get_session().shell(command)
+    except Exception as e:
+        return f"Error: {e}"
+
+
+_inventory = None
+_serial = None
+
+
+def get_inventory():
+    """Return the shared package inventory, opening it on first use."""
+    global _inventory
+    if _inventory is None:
+        _inventory = Inventory()
+    return _inventory
+
+
+def device_serial():
+    """Serial number of the connected device, asked once per run."""
+    global _serial
+    if _serial is None:
+        _serial = get_session().shell("getprop ro.serialno")
+    return _serial
+
+
+def user_packages(force=False):
+    """Return {name: PackageInfo} for the user apps, from the inventory.
+
+    Served from the latest snapshot while it is fresh (see Inventory.get),
+    so repeated menu actions don't go back to the device.
+    """
+    try:
+        inventory = get_inventory()
+        _, packages = inventory.get(device_serial(), get_session().shell, force)
+    except Exception as e:
+        print(f"Error: {e}")
+        return {}
+    return packages
+
+
 def list_user_apps():
     """List all user-installed apps, highlight suspicious ones."""
-    output = run_adb("shell pm list packages -3")
-    packages = [line.replace("package:", "") for line in output.splitlines()]
+    packages = sorted(user_packages())
 
     print("\nUser-installed apps:")
     for pkg in packages:
-        if any(keyword.lower() in pkg.lower() for keyword in SUSPICIOUS_KEYWORDS):
+        if SUSPICIOUS_MATCHER.find(pkg):
             print(f"[!] {pkg}  <-- Suspicious")
         else:
             print(pkg)
@@ -40,47 +105,120 @@ def list_user_apps():
 
 
 def uninstall_app(packages=None):
-    """Prompt the user to uninstall an app."""
+    """Prompt the user to uninstall one or more apps.
+
+    Several package names (separated by spaces) are uninstalled in one go
+    over the shell session, with a result per package.
+    """
     if not packages:
         packages = list_user_apps()
-    pkg = input("\nEnter package name to uninstall: ").strip()
-    if pkg not in packages:
+    chosen = input("\nEnter package name(s) to uninstall: ").split()
+    unknown = [pkg for pkg in chosen if pkg not in packages]
+    if not chosen or unknown:
         print("Package not found among user-installed apps!")
         return
     confirm = (
-        input(f"Are you sure you want to uninstall {pkg}? (y/n): ").strip().lower()
+        input(f"Are you sure you want to uninstall {', '.join(chosen)}? (y/n): ")
+        .strip()
+        .lower()
     )
-    if confirm == "y":
-        output = run_adb(f"uninstall {pkg}")
+    if confirm != "y":
+        print("Uninstall canceled.")
+        return
+    if len(chosen) == 1:
+        output = run_adb(f"uninstall {chosen[0]}")
         print(output)
+        succeeded = "Success" in output
     else:
-        print("Uninstall canceled.")
+        results = list(run_bulk("uninstall", chosen, get_session().shell))
+        print_results(results)
+        succeeded = any(r.ok for r in results)
+    if succeeded:
+        get_inventory().invalidate(device_serial())
 
 
 def check_foreground_app(duration=10, interval=2):
     """Monitor foreground app in real-time for a set duration."""
     print(f"\nMonitoring foreground app for {duration} seconds...")
     for _ in range(duration // interval):
-        output = run_adb("shell dumpsys window windows | grep mCurrentFocus")
+        output = run_shell("dumpsys window windows | grep mCurrentFocus")
         print(output)
         time.sleep(interval)
 
 
+def rank_apps_by_risk():
+    """Score every user app and print them riskiest first, with reasons."""
+    try:
+        table = score_device(get_session().shell)
+    except Exception as e:
+        print(f"Error: {e}")
+        return
+    print_risk_table(table)
+
+
+def show_app_changes():
+    """Take a new snapshot and show what changed since the previous one."""
+    try:
+        inventory = get_inventory()
+        previous = inventory.latest(device_serial())
+        current, packages = inventory.get(device_serial(), get_session().shell, True)
+    except Exception as e:
+        print(f"Error: {e}")
+        return
+    if not previous:
+        print(f"\nFirst snapshot recorded ({len(packages)} user apps).")
+        return
+    print("\nChanges since the last snapshot:")
+    print_diff(inventory.diff(previous[0][0], current))
+
+
+def track_foreground_app(duration=10):
+    """Print foreground app changes as they happen, then time per app.
+
+    Follows one logcat stream of focus events instead of polling dumpsys,
+    and falls back to check_foreground_app if no event arrives.
+    """
+    print(f"\nTracking foreground app for {duration} seconds...")
+    tracker = ForegroundTracker(adb=ADB)
+    try:
+        for transition in tracker.stream(duration):
+            print(format_transition(transition))
+    except OSError as e:
+        print(f"Error: {e}")
+    if not tracker.transitions:
+        print("No focus events received; polling instead.")
+        check_foreground_app(duration)
+        return
+    print("\nTime in foreground:")
+    for pkg, seconds in tracker.report():
+        print(f"{seconds:>9.1f}s  {pkg}")
+
+
 def list_overlay_permissions():
     """List apps allowed to draw over others."""
-    output = run_adb("shell appops query-op SYSTEM_ALERT_WINDOW --user 0")
+    output = run_shell("appops query-op SYSTEM_ALERT_WINDOW --user 0")
     print("\nApps allowed to display over others:")
     print(output)
 
 
 def list_notification_permissions():
     """List apps allowed to post notifications."""
-    output = run_adb("shell appops query-op POST_NOTIFICATION --user 0")
+    output = run_shell("appops query-op POST_NOTIFICATION --user 0")
     print("\nApps allowed to post notifications:")
     print(output)
 
 
 def main():
+    try:
+        menu()
+    finally:
+        if _session is not None:
+            _session.close()
+        if _inventory is not None:
+            _inventory.close()
+
+
+def menu():
     while True:
         print("\n=== Interactive ADB Menu ===")
         print("1. List user-installed apps")
@@ -88,9 +226,11 @@ def main():
         print("3. Monitor foreground app")
         print("4. List apps with overlay permission")
         print("5. List apps allowed to post notifications")
-        print("6. Exit")
+        print("6. Show app changes since the last snapshot")
+        print("7. Rank apps by risk")
+        print("8. Exit")
 
-        choice = input("Choose an option (1-6): ").strip()
+        choice = input("Choose an option (1-8): ").strip()
 
         if choice == "1":
             list_user_apps()
@@ -101,17 +241,18 @@ def main():
                 duration = int(
                     input("Duration to monitor (seconds, default 10): ") or "10"
                 )
-                interval = int(
-                    input("Interval between checks (seconds, default 2): ") or "2"
-                )
             except ValueError:
-                duration, interval = 10, 2
-            check_foreground_app(duration, interval)
+                duration = 10
+            track_foreground_app(duration)
         elif choice == "4":
             list_overlay_permissions()
         elif choice == "5":
             list_notification_permissions()
         elif choice == "6":
+            show_app_changes()
+        elif choice == "7":
+            rank_apps_by_risk()
+        elif choice == "8":
             print("Exiting…")
             break
         else:
@@ -0,0 +1,187 @@
+import re
+from collections import deque, namedtuple
+
+from inventory import parse_dumpsys_packages, parse_package_list
+
+_SPLIT = "__RISK_SPLIT__"
+
+OVERLAY_OP = "SYSTEM_ALERT_WINDOW"
+NOTIFICATION_OP = "POST_NOTIFICATION"
+
+# Everything the score needs, in one device round-trip.
+RISK_COMMAND = f"; echo {_SPLIT}; ".join(
+    [
+        "pm list packages -3",
+        "dumpsys package packages",
+        f"appops query-op {OVERLAY_OP} --user 0",
+        f"appops query-op {NOTIFICATION_OP} --user 0",
+    ]
+)
+
+# Words in package names typical of adware and junk apps, with weights.
+KEYWORD_WEIGHTS = {
+    "clean": 2,
+    "cleaner": 1,
+    "booster": 3,
+    "boost": 1,
+    "junk": 3,
+    "speed": 2,
+    "battery": 2,
+    "saver": 1,
+    "security": 1,
+    "antivirus": 2,
+    "master": 1,
+    "flashlight": 2,
+    "wallpaper": 1,
+    "vpn": 1,
+    "free": 1,
+    "coins": 2,
+    "cheat": 2,
+    "hack": 2,
+    "game": 1,
+}
+
+# Granted permissions that let an app spy, spend or take over the device.
+PERMISSION_WEIGHTS = {
+    "android.permission.BIND_ACCESSIBILITY_SERVICE": 4,
+    "android.permission.BIND_DEVICE_ADMIN": 4,
+    "android.permission.REQUEST_INSTALL_PACKAGES": 3,
+    "android.permission.SEND_SMS": 3,
+    "android.permission.READ_SMS": 3,
+    "android.permission.RECEIVE_SMS": 2,
+    "android.permission.READ_CALL_LOG": 2,
+    "android.permission.READ_CONTACTS": 1,
+    "android.permission.RECORD_AUDIO": 1,
+    "android.permission.ACCESS_FINE_LOCATION": 1,
+    "android.permission.PACKAGE_USAGE_STATS": 2,
+    "android.permission.QUERY_ALL_PACKAGES": 1,
+    "android.permission.RECEIVE_BOOT_COMPLETED": 1,
+}
+
+OVERLAY_WEIGHT = 3
+NOTIFICATION_WEIGHT = 1
+SIDELOADED_WEIGHT = 2
+TRUSTED_INSTALLERS = {"com.android.vending", "com.google.android.packageinstaller"}
+
+# Apps scoring at least this are flagged.
+RISK_THRESHOLD = 4
+
+RiskEntry = namedtuple("RiskEntry", "package score reasons")
+
+_PACKAGE_NAME_RE = re.compile(r"^[A-Za-z][\w]*(\.[\w]+)+$")
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over a fixed set of keywords.
+
+    Built once; find() then reports every keyword occurring in a text in
+    one left-to-right scan, however many keywords there are. Matching is
+    case-insensitive.
+    """
+
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for keyword in keywords:
+            state = 0
+            for ch in keyword.lower():
+                if ch not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.out[state].append(keyword)
+
+        # Breadth-first, so a state's failure target is always built first
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(ch, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def find(self, text):
+        """Return the set of keywords that occur in text."""
+        found = set()
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for ch in text.lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+KEYWORDS = KeywordMatcher(KEYWORD_WEIGHTS)
+
+
+def parse_appops(output):
+    """Package names listed by `appops query-op`."""
+    return {
+        line.strip()
+        for line in output.splitlines()
+        if _PACKAGE_NAME_RE.match(line.strip())
+    }
+
+
+def score_package(name, details, overlay, notifications, matcher=KEYWORDS):
+    """Score one package; returns a RiskEntry whose reasons explain the score.
+
+    details is the package's entry from parse_dumpsys_packages; overlay and
+    notifications are the sets of packages holding those app-ops.
+    """
+    reasons = []
+    for keyword in sorted(matcher.find(name)):
+        weight = KEYWORD_WEIGHTS.get(keyword, 1)
+        reasons.append((f"name contains '{keyword}'", weight))
+    if name in overlay:
+        reasons.append(("may draw over other apps", OVERLAY_WEIGHT))
+    if name in notifications:
+        reasons.append(("may post notifications", NOTIFICATION_WEIGHT))
+    granted = details.get("granted", set())
+    for permission in sorted(granted & PERMISSION_WEIGHTS.keys()):
+        short = permission.rsplit(".", 1)[-1]
+        reasons.append((f"granted {short}", PERMISSION_WEIGHTS[permission]))
+    installer = details.get("installerPackageName")
+    if installer not in TRUSTED_INSTALLERS:
+        source = "unknown source" if installer in (None, "null") else installer
+        reasons.append((f"installed from {source}", SIDELOADED_WEIGHT))
+    return RiskEntry(name, sum(weight for _, weight in reasons), reasons)
+
+
+def score_output(output):
+    """Rank the user apps in the output of RISK_COMMAND, riskiest first."""
+    parts = output.split(_SPLIT)
+    parts += [""] * (4 - len(parts))
+    names, dumpsys, overlay, notifications = parts[:4]
+    details = parse_dumpsys_packages(dumpsys)
+    overlay, notifications = parse_appops(overlay), parse_appops(notifications)
+    table = [
+        score_package(name, details.get(name, {}), overlay, notifications)
+        for name in parse_package_list(names)
+    ]
+    table.sort(key=lambda entry: (-entry.score, entry.package))
+    return table
+
+
+def score_device(shell):
+    """Rank a device's user apps; shell(command) runs one device command."""
+    return score_output(shell(RISK_COMMAND))
+
+
+def print_risk_table(table, limit=None, explain=True):
+    print(f"\n{'Score':>5}  Package")
+    for entry in table[:limit]:
+        flag = "  <-- Suspicious" if entry.score >= RISK_THRESHOLD else ""
+        print(f"{entry.score:>5}  {entry.package}{flag}")
+        if explain:
+            for reason, weight in entry.reasons:
+                print(f"{'':>7}+{weight} {reason}")
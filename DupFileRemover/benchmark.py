@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from hash_index import HashIndex
+from main import (
+    HASH_BACKENDS,
+    find_duplicates_serial,
+    find_duplicates_staged,
+    iter_duplicates_streaming,
+)
+
+KIB = 1024
+MIB = 1024 * KIB
+
+# (low, high) byte ranges and their weights for each size distribution.
+SIZE_DISTRIBUTIONS = {
+    "small": [((0, 4 * KIB), 3), ((4 * KIB, 64 * KIB), 1)],
+    "mixed": [
+        ((0, 4 * KIB), 4),
+        ((4 * KIB, 256 * KIB), 4),
+        ((256 * KIB, 4 * MIB), 2),
+        ((4 * MIB, 32 * MIB), 1),
+    ],
+    "large": [((4 * MIB, 64 * MIB), 1)],
+}
+
+
+def _random_size(rng, distribution):
+    ranges, weights = zip(*SIZE_DISTRIBUTIONS[distribution])
+    low, high = rng.choices(ranges, weights)[0]
+    return rng.randint(low, high)
+
+
+def build_tree(
+    root,
+    files=2000,
+    dup_ratio=0.3,
+    near_ratio=0.1,
+    distribution="mixed",
+    depth=3,
+    fanout=4,
+    seed=0,
+):
+    """Fill root with a synthetic tree for benchmarking.
+
+    dup_ratio of the files are exact copies of an earlier file. near_ratio
+    are the same size as an earlier file and share its first and last
+    blocks but differ in the middle, which the partial-hash stage cannot
+    tell apart. The rest are unique. Returns the total bytes written.
+    """
+    rng = random.Random(seed)
+    dirs = [root]
+    for level in range(depth):
+        dirs += [
+            os.path.join(d, f"d{level}_{i}")
+            for d in dirs
+            if d.count(os.sep) - root.count(os.sep) == level
+            for i in range(fanout)
+        ]
+    for d in dirs:
+        os.makedirs(d, exist_ok=True)
+
+    written = []
+    total = 0
+    for n in range(files):
+        path = os.path.join(rng.choice(dirs), f"f{n}.bin")
+        kind = rng.random()
+        if written and kind < dup_ratio:
+            shutil.copyfile(rng.choice(written), path)
+        elif written and kind < dup_ratio + near_ratio:
+            source = rng.choice(written)
+            with open(source, "rb") as f:
+                data = bytearray(f.read())
+            if len(data) > 2 * 64 * KIB:
+                middle = len(data) // 2
+                data[middle : middle + 16] = rng.randbytes(16)
+            else:
+                data = rng.randbytes(len(data))
+            with open(path, "wb") as f:
+                f.write(data)
+        else:
+            with open(path, "wb") as f:
+                f.write(rng.randbytes(_random_size(rng, distribution)))
+        written.append(path)
+        total += os.path.getsize(path)
+    return total
+
+
+def _engines(workers, index_path):
+    """(name, callable returning groups) for every path being compared."""
+
+    def staged(**options):
+        return lambda root: find_duplicates_staged(root, **options)[0]
+
+    def streaming(root):
+        return list(iter_duplicates_streaming(root, workers=workers))
+
+    def indexed(root):
+        with HashIndex(index_path) as index:
+            return find_duplicates_staged(root, index=index)[0]
+
+    engines = [
+        ("serial", lambda root: find_duplicates_serial(root)[0]),
+        ("staged", staged()),
+        (f"staged threads={workers}", staged(workers=workers)),
+        (
+            f"staged processes={workers}",
+            staged(workers=workers, processes=True),
+        ),
+        ("staged blake2b", staged(algo="blake2b")),
+        ("staged index (cold)", indexed),
+        ("staged index (warm)", indexed),
+        ("stream", streaming),
+    ]
+    if "xxh3" in HASH_BACKENDS:
+        engines.append(("staged xxh3", staged(algo="xxh3")))
+    return engines
+
+
+def _canonical(groups):
+    return sorted(sorted(group) for group in groups)
+
+
+def run_benchmark(root, total_bytes, workers=4, repeat=1):
+    """Time every engine on root and check it agrees with the serial path."""
+    files = sum(len(names) for _, _, names in os.walk(root))
+    index_path = os.path.join(tempfile.mkdtemp(), "bench.sqlite")
+    results = []
+    reference = None
+    for name, engine in _engines(workers, index_path):
+        best = None
+        for _ in range(repeat if "index" not in name else 1):
+            start = time.perf_counter()
+            groups = engine(root)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if reference is None:
+            reference = _canonical(groups)
+        results.append(
+            {
+                "engine": name,
+                "seconds": best,
+                "files_per_s": files / best if best else 0,
+                "mb_per_s": total_bytes / MIB / best if best else 0,
+                "groups": len(groups),
+                "matches_serial": _canonical(groups) == reference,
+            }
+        )
+    shutil.rmtree(os.path.dirname(index_path))
+    return results
+
+
+def print_results(results):
+    print(
+        f"\n{'Engine':<26}{'Seconds':>10}{'Files/s':>12}{'MB/s':>10}"
+        f"{'Groups':>8}  OK"
+    )
+    for r in results:
+        print(
+            f"{r['engine']:<26}{r['seconds']:>10.3f}{r['files_per_s']:>12.0f}"
+            f"{r['mb_per_s']:>10.1f}{r['groups']:>8}  "
+            f"{'yes' if r['matches_serial'] else 'MISMATCH'}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the duplicate finders on a synthetic tree."
+    )
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--dup-ratio", type=float, default=0.3)
+    parser.add_argument("--near-ratio", type=float, default=0.1)
+    parser.add_argument(
+        "--sizes", choices=sorted(SIZE_DISTRIBUTIONS), default="mixed"
+    )
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--dir", help="build the tree here instead of a temporary directory"
+    )
+    parser.add_argument("--json", metavar="PATH", help="also write results here")
+    args = parser.parse_args()
+
+    root = args.dir or tempfile.mkdtemp(prefix="dupbench-")
+    try:
+        print(f"Building {args.files} files in {root} ...")
+        total = build_tree(
+            root,
+            args.files,
+            args.dup_ratio,
+            args.near_ratio,
+            args.sizes,
+            args.depth,
+            seed=args.seed,
+        )
+        print(f"{total / MIB:.1f} MiB written.")
+        results = run_benchmark(root, total, args.workers, args.repeat)
+    finally:
+        if not args.dir:
+            shutil.rmtree(root)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"options": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+import hashlib
+import os
+import random
+import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# FastCDC-style chunk size bounds in bytes.
+MIN_CHUNK = 2 * 1024
+AVG_CHUNK = 8 * 1024
+MAX_CHUNK = 64 * 1024
+
+READ_BLOCK = 1024 * 1024
+
+# Chunks never cross a multiple of this offset, so the segments of a large
+# file can be chunked in parallel; it costs one extra cut per segment.
+SEGMENT = 64 * 1024 * 1024
+
+# Segments queued per worker process.
+QUEUED_PER_WORKER = 4
+
+_MASK64 = (1 << 64) - 1
+
+# Fixed pseudo-random gear table, so chunk boundaries are stable across runs.
+_rng = random.Random(0x5EED)
+GEAR = [_rng.getrandbits(64) for _ in range(256)]
+del _rng
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    file INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+
+def _top_mask(bits):
+    """Mask of the `bits` highest bits of a 64-bit hash."""
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+def _masks(avg_size):
+    bits = avg_size.bit_length() - 1
+    # Normalized chunking: harder to cut before avg_size, easier after it
+    return _top_mask(bits + 1), _top_mask(bits - 1)
+
+
+def _cut_point(buf, n, min_size, avg_size, mask_s, mask_l):
+    """Return the length of the first chunk in buf[:n]."""
+    if n <= min_size:
+        return n
+    gear = GEAR
+    h = 0
+    normal = min(avg_size, n)
+    for i in range(min_size, normal):
+        h = ((h << 1) + gear[buf[i]]) & _MASK64
+        if not h & mask_s:
+            return i + 1
+    for i in range(normal, n):
+        h = ((h << 1) + gear[buf[i]]) & _MASK64
+        if not h & mask_l:
+            return i + 1
+    return n
+
+
+def iter_chunks(
+    f, min_size=MIN_CHUNK, avg_size=AVG_CHUNK, max_size=MAX_CHUNK, length=None
+):
+    """Split a binary file object into content-defined chunks.
+
+    Boundaries are picked by a gear rolling hash, so an insertion only moves
+    the chunks around it. Holds at most READ_BLOCK + max_size bytes. With
+    length, no more than length bytes are read from f.
+    """
+    mask_s, mask_l = _masks(avg_size)
+    buf = bytearray()
+    eof = False
+    while True:
+        while not eof and len(buf) < max_size:
+            want = READ_BLOCK if length is None else min(READ_BLOCK, length)
+            data = f.read(want) if want else b""
+            if data:
+                buf += data
+                if length is not None:
+                    length -= len(data)
+            else:
+                eof = True
+        if not buf:
+            return
+        n = min(len(buf), max_size)
+        cut = _cut_point(buf, n, min_size, avg_size, mask_s, mask_l)
+        yield bytes(buf[:cut])
+        del buf[:cut]
+
+
+def chunk_digest(chunk):
+    return hashlib.blake2b(chunk, digest_size=16).digest()
+
+
+def file_segments(path, size):
+    """Split a file of size bytes into (path, offset, length) jobs of at
+    most SEGMENT bytes; an empty file is one empty job."""
+    return [
+        (path, offset, min(SEGMENT, size - offset))
+        for offset in range(0, size, SEGMENT)
+    ] or [(path, 0, 0)]
+
+
+def chunk_segment(job, **chunk_options):
+    """Return [(digest, size)] for the chunks of one file_segments job.
+
+    A module-level function, so process pool workers can run it.
+    """
+    path, offset, length = job
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return [
+            (chunk_digest(chunk), len(chunk))
+            for chunk in iter_chunks(f, length=length, **chunk_options)
+        ]
+
+
+
+
+class ChunkIndex:
+    """Index of chunk digests per file, kept in SQLite.
+
+    The default database is a private temporary one that spills to disk
+    once it outgrows SQLite's page cache, so memory stays bounded however
+    many chunks are indexed. Reports are streamed from SQL cursors.
+    """
+
+    def __init__(self, path=""):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self._indexed = False
+
+    def add_file(self, path, **chunk_options):
+        """Chunk one file into the index. Returns its (chunks, bytes)."""
+        try:
+            segments = file_segments(path, os.path.getsize(path))
+        except OSError as e:
+            print(f"Error reading {path}: {e}")
+            return 0, 0
+        return self.add_chunks(
+            path, (chunk_segment(job, **chunk_options) for job in segments)
+        )
+
+    def add_chunks(self, path, segments):
+        """Index a file from its segments' chunks, in order.
+
+        segments yields a [(digest, size)] list per segment, and may be a
+        generator doing the chunking: an error while iterating it drops the
+        whole file. Returns the file's (chunks, bytes).
+        """
+        file_id = self.conn.execute(
+            "INSERT INTO files (path, size) VALUES (?, 0)", (path,)
+        ).lastrowid
+        count = total = 0
+        try:
+            for chunks in segments:
+                batch = [(file_id, digest, size) for digest, size in chunks]
+                count += len(batch)
+                total += sum(size for _, size in chunks)
+                self._insert(batch)
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+            self.conn.execute("DELETE FROM chunks WHERE file = ?", (file_id,))
+            self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            return 0, 0
+        self.conn.execute("UPDATE files SET size = ? WHERE id = ?", (total, file_id))
+        self._indexed = False
+        return count, total
+
+    def _insert(self, batch):
+        self.conn.executemany(
+            "INSERT INTO chunks (file, digest, size) VALUES (?, ?, ?)", batch
+        )
+        batch.clear()
+
+    def _ensure_indexes(self):
+        if not self._indexed:
+            self.conn.executescript(
+                """
+                CREATE INDEX IF NOT EXISTS chunks_digest ON chunks (digest, file);
+                CREATE INDEX IF NOT EXISTS chunks_file ON chunks (file);
+                ANALYZE;
+                """
+            )
+            self._indexed = True
+
+    def summary(self):
+        """Total bytes, bytes left after chunk dedup, and their ratio."""
+        self._ensure_indexes()
+        total = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM files"
+        ).fetchone()[0]
+        unique = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM "
+            "(SELECT MAX(size) AS size FROM chunks GROUP BY digest)"
+        ).fetchone()[0]
+        return {
+            "files": self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0],
+            "total_bytes": total,
+            "unique_bytes": unique,
+            "dedup_ratio": total / unique if unique else 1.0,
+        }
+
+    def file_report(self):
+        """Yield (path, size, shared_bytes) for each file.
+
+        shared_bytes counts the file's chunks that also occur in another file.
+        """
+        self._ensure_indexes()
+        yield from self.conn.execute(
+            """
+            SELECT f.path, f.size, COALESCE((
+                SELECT SUM(c.size) FROM chunks AS c
+                WHERE c.file = f.id AND EXISTS (
+                    SELECT 1 FROM chunks AS o
+                    WHERE o.digest = c.digest AND o.file != c.file
+                )
+            ), 0)
+            FROM files AS f ORDER BY f.id
+            """
+        )
+
+    def pair_report(self, limit=100):
+        """Yield (path_a, path_b, shared_bytes) for the most-overlapping pairs."""
+        self._ensure_indexes()
+        yield from self.conn.execute(
+            """
+            SELECT fa.path, fb.path, shared FROM (
+                SELECT a.file AS fa_id, b.file AS fb_id, SUM(a.size) AS shared
+                FROM (SELECT DISTINCT file, digest, size FROM chunks) AS a
+                JOIN (SELECT DISTINCT file, digest FROM chunks) AS b
+                    ON a.digest = b.digest AND a.file < b.file
+                GROUP BY a.file, b.file
+                ORDER BY shared DESC
+                LIMIT ?
+            )
+            JOIN files AS fa ON fa.id = fa_id
+            JOIN files AS fb ON fb.id = fb_id
+            ORDER BY shared DESC
+            """,
+            (limit,),
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _walk_sizes(folder, recursive, accept):
+    """Yield (path, size) for the files under folder that accept takes."""
+    for root, _, files in os.walk(folder):
+        for filename in files:
+            path = os.path.join(root, filename)
+            try:
+                size = os.path.getsize(path)
+            except OSError as e:
+                print(f"Error reading {path}: {e}")
+                continue
+            if accept is None or accept(path, size):
+                yield path, size
+
+        if not recursive:
+            break
+
+
+def analyze_folder(
+    folder, recursive=True, index=None, accept=None, workers=0, **chunk_options
+):
+    """Chunk every file under folder into a ChunkIndex and return it.
+
+    accept(path, size), if given, decides which files are chunked. The
+    gear hash runs in Python at about 5 MB/s per core, so with workers > 0
+    the SEGMENT-sized pieces of every file are chunked on that many
+    processes, and the main process inserts their digests in order; the
+    index comes out the same as with workers=0.
+    """
+    if index is None:
+        index = ChunkIndex()
+    files = _walk_sizes(folder, recursive, accept)
+    if not workers:
+        for path, size in files:
+            segments = file_segments(path, size)
+            index.add_chunks(
+                path, (chunk_segment(job, **chunk_options) for job in segments)
+            )
+        return index
+
+    jobs = (
+        (n, path, job)
+        for n, (path, size) in enumerate(files)
+        for job in file_segments(path, size)
+    )
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # (file number, path, future) of the segments in flight, in order
+        queued = deque()
+
+        def top_up():
+            while len(queued) < workers * QUEUED_PER_WORKER:
+                item = next(jobs, None)
+                if item is None:
+                    return
+                n, path, job = item
+                future = pool.submit(chunk_segment, job, **chunk_options)
+                queued.append((n, path, future))
+
+        def results(n):
+            while queued and queued[0][0] == n:
+                future = queued.popleft()[2]
+                top_up()
+                yield future.result()
+
+        top_up()
+        while queued:
+            n, path, _ = queued[0]
+            index.add_chunks(path, results(n))
+            # Segments left behind by a file that failed part way
+            while queued and queued[0][0] == n:
+                queued.popleft()[2].cancel()
+                top_up()
+    return index
+
+
+def print_chunk_report(index, limit=20):
+    """Print the dedup summary and the file pairs sharing the most bytes."""
+    summary = index.summary()
+    print(f"\nFiles: {summary['files']}")
+    print(f"Total bytes: {summary['total_bytes']}")
+    print(f"Unique chunk bytes: {summary['unique_bytes']}")
+    print(f"Dedup ratio: {summary['dedup_ratio']:.2f}x")
+
+    print(f"\nTop {limit} overlapping pairs:")
+    for path_a, path_b, shared in index.pair_report(limit):
+        print(f"{shared:>14}  {path_a}  <->  {path_b}")
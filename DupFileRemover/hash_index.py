@@ -0,0 +1,123 @@
+import os
+import sqlite3
+
+INDEX_NAME = ".dupindex.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    seen INTEGER NOT NULL,
+    PRIMARY KEY (dev, ino, kind)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class HashIndex:
+    """On-disk cache of file digests keyed by device, inode, size and mtime_ns.
+
+    A stored digest is only returned while the file's size and mtime_ns still
+    match, so modified files are re-read. Every scan bumps a generation
+    counter and marks the rows it used; compact() drops rows the latest scan
+    did not touch (deleted or replaced files) and vacuums the database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.generation = self._get_meta("generation")
+        self._seen = []
+
+    @classmethod
+    def for_root(cls, root):
+        """Open the index stored inside a scanned root."""
+        return cls(os.path.join(root, INDEX_NAME))
+
+    def is_index_file(self, path):
+        """True for the index database and its journal files."""
+        return os.path.abspath(path).startswith(os.path.abspath(self.path))
+
+    def _get_meta(self, key):
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def begin_scan(self):
+        """Start a new scan generation."""
+        self.generation += 1
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)",
+                (self.generation,),
+            )
+
+    def get(self, st, kind):
+        """Return the stored digest for a stat result, or None if stale."""
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, digest FROM digests "
+            "WHERE dev = ? AND ino = ? AND kind = ?",
+            (st.st_dev, st.st_ino, kind),
+        ).fetchone()
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+            return None
+        self._seen.append((self.generation, st.st_dev, st.st_ino, kind))
+        return row[2]
+
+    def put(self, st, kind, digest):
+        """Store a digest, replacing any stale entry for the same inode."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO digests "
+            "(dev, ino, kind, size, mtime_ns, digest, seen) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                st.st_dev,
+                st.st_ino,
+                kind,
+                st.st_size,
+                st.st_mtime_ns,
+                digest,
+                self.generation,
+            ),
+        )
+
+    def flush(self):
+        """Write pending updates to disk."""
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE digests SET seen = ? WHERE dev = ? AND ino = ? AND kind = ?",
+                self._seen,
+            )
+        self._seen = []
+
+    def compact(self):
+        """Drop entries not used by the latest scan and vacuum the database.
+
+        Returns the number of entries removed.
+        """
+        self.flush()
+        with self.conn:
+            removed = self.conn.execute(
+                "DELETE FROM digests WHERE seen < ?", (self.generation,)
+            ).rowcount
+        self.conn.execute("VACUUM")
+        return removed
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,255 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+IMAGE_EXTENSIONS = {
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".bmp",
+    ".tiff",
+    ".tif",
+    ".webp",
+}
+
+# pHash is taken from the low frequencies of a DCT over a 32x32 thumbnail.
+PHASH_SIZE = 32
+
+
+def _load(path, width, height):
+    """Decode path as a width x height greyscale image, as a flat pixel list."""
+    if Image is None:
+        raise RuntimeError("Image mode needs Pillow: pip install Pillow")
+    resample = getattr(Image, "Resampling", Image).LANCZOS
+    with Image.open(path) as img:
+        # Let the JPEG decoder downscale while decoding
+        img.draft("L", (width * 4, height * 4))
+        small = img.convert("L").resize((width, height), resample)
+        return list(small.getdata())
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bit
+    return value
+
+
+def ahash(path, hash_size=8):
+    """Average hash: each bit says whether a pixel is brighter than the mean."""
+    pixels = _load(path, hash_size, hash_size)
+    mean = sum(pixels) / len(pixels)
+    return _bits_to_int(p > mean for p in pixels)
+
+
+def dhash(path, hash_size=8):
+    """Difference hash: each bit compares a pixel with its right neighbour."""
+    width = hash_size + 1
+    pixels = _load(path, width, hash_size)
+    return _bits_to_int(
+        pixels[row * width + col] > pixels[row * width + col + 1]
+        for row in range(hash_size)
+        for col in range(hash_size)
+    )
+
+
+_DCT_CACHE = {}
+
+
+def _dct_matrix(n, k):
+    """Rows 0..k-1 of the n-point DCT-II basis."""
+    if (n, k) not in _DCT_CACHE:
+        _DCT_CACHE[n, k] = [
+            [math.cos(math.pi * (2 * x + 1) * u / (2 * n)) for x in range(n)]
+            for u in range(k)
+        ]
+    return _DCT_CACHE[n, k]
+
+
+def phash(path, hash_size=8):
+    """Perceptual hash: compares low DCT frequencies with their median."""
+    n = PHASH_SIZE
+    pixels = _load(path, n, n)
+    rows = [pixels[i * n : (i + 1) * n] for i in range(n)]
+    basis = _dct_matrix(n, hash_size)
+
+    # Separable 2D DCT, keeping only the top-left hash_size x hash_size block
+    row_freqs = [[sum(b * p for b, p in zip(u, row)) for u in basis] for row in rows]
+    coeffs = [
+        sum(basis[v][y] * row_freqs[y][u] for y in range(n))
+        for v in range(hash_size)
+        for u in range(hash_size)
+    ]
+    # The DC term only reflects overall brightness
+    median = sorted(coeffs[1:])[len(coeffs[1:]) // 2]
+    return _bits_to_int(c > median for c in coeffs)
+
+
+HASHERS = {"ahash": ahash, "dhash": dhash, "phash": phash}
+
+
+def image_hash(path, method="dhash", hash_size=8):
+    """Compute a perceptual hash of an image, or None if it can't be read."""
+    try:
+        return HASHERS[method](path, hash_size)
+    except RuntimeError:
+        raise
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        return None
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance.
+
+    Each node keeps every item that has exactly its hash. A radius search
+    only descends into children whose edge distance lies within radius of
+    the query's distance to the node, so most of the tree is skipped.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, key, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [key, [item], {}]
+            return
+        node = self.root
+        while True:
+            dist = hamming(key, node[0])
+            if dist == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(dist)
+            if child is None:
+                node[2][dist] = [key, [item], {}]
+                return
+            node = child
+
+    def search(self, key, radius):
+        """Return (distance, key, items) for every hash within radius."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_key, items, children = stack.pop()
+            dist = hamming(key, node_key)
+            if dist <= radius:
+                found.append((dist, node_key, items))
+            for edge, child in children.items():
+                if dist - radius <= edge <= dist + radius:
+                    stack.append(child)
+        return found
+
+
+def walk_images(folder, recursive=True, accept=None):
+    """Yield image paths under folder (or each of a list of folders) in
+    os.walk order.
+
+    accept(path, size), if given, can reject files before they are decoded.
+    """
+    roots = [folder] if isinstance(folder, (str, os.PathLike)) else list(folder)
+    for top in roots:
+        for root, _, files in os.walk(top):
+            for filename in files:
+                if os.path.splitext(filename)[1].lower() not in IMAGE_EXTENSIONS:
+                    continue
+                path = os.path.join(root, filename)
+                if accept is not None:
+                    try:
+                        if not accept(path, os.path.getsize(path)):
+                            continue
+                    except OSError:
+                        continue
+                yield path
+
+            if not recursive:
+                break
+
+
+def group_similar(hashed, max_distance=4):
+    """Group (path, hash) pairs whose hashes are within max_distance.
+
+    Groups are the connected components of the "within distance" relation,
+    found with one BK-tree radius query per distinct hash. Each group lists
+    paths in input order, and groups are ordered by their first path.
+    """
+    order = {}
+    by_hash = {}
+    for path, key in hashed:
+        order[path] = len(order)
+        by_hash.setdefault(key, []).append(path)
+
+    tree = BKTree()
+    for key in by_hash:
+        tree.add(key, key)
+
+    parent = {key: key for key in by_hash}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for key in by_hash:
+        for _, other, _ in tree.search(key, max_distance):
+            a, b = find(key), find(other)
+            if a != b:
+                parent[b] = a
+
+    components = {}
+    for key, paths in by_hash.items():
+        components.setdefault(find(key), []).extend(paths)
+
+    groups = [
+        sorted(paths, key=order.get)
+        for paths in components.values()
+        if len(paths) > 1
+    ]
+    groups.sort(key=lambda group: order[group[0]])
+    return groups
+
+
+def find_similar_images(
+    folder,
+    recursive=True,
+    method="dhash",
+    max_distance=4,
+    hash_size=8,
+    workers=0,
+    accept=None,
+):
+    """Find groups of visually similar images under folder, or across all
+    of a list of folders.
+
+    Every image is hashed once with method (see HASHERS), on a thread
+    pool when workers > 0, and the hashes are grouped with group_similar.
+    """
+    if method not in HASHERS:
+        raise ValueError(f"Unknown image hash method: {method}")
+
+    paths = list(walk_images(folder, recursive, accept))
+
+    def job(path):
+        return image_hash(path, method, hash_size)
+
+    if workers:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            hashes = list(pool.map(job, paths))
+    else:
+        hashes = [job(path) for path in paths]
+
+    hashed = [(path, key) for path, key in zip(paths, hashes) if key is not None]
+    return group_similar(hashed, max_distance)
@@ -1,58 +1,1230 @@
 import os
+import argparse
+import contextlib
+import fnmatch
 import hashlib
+import json
+import mmap
+import shutil
+import sqlite3
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-def file_hash(path, chunk_size=8192):
-    """Compute SHA256 hash of a file."""
-    sha = hashlib.sha256()
+from hash_index import HashIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Hash constructors by name. Digests are only ever compared (and cached)
+# together with the name of the backend that produced them.
+HASH_BACKENDS = {
+    "sha256": hashlib.sha256,
+    "blake2b": hashlib.blake2b,
+}
+if xxhash is not None:
+    HASH_BACKENDS["xxh3"] = xxhash.xxh3_128
+
+# Backends that are fast but not collision resistant; their matches are
+# confirmed with a cryptographic hash.
+NON_CRYPTO_BACKENDS = {"xxh3"}
+
+# Bytes hashed from each end of a file during the partial-hash stage.
+PARTIAL_BYTES = 4096
+
+# Read size bounds used by the concurrent hashing mode.
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Upper bound on files held open at once by the worker pool.
+MAX_OPEN_FILES = 64
+
+# Linux ioctl that clones a file's extents (btrfs, XFS, bcachefs, ...).
+FICLONE = 0x40049409
+
+ACTIONS = ("delete", "hardlink", "reflink", "quarantine")
+
+# Files at least this large are hashed from a memory map.
+MMAP_THRESHOLD = 16 * 1024 * 1024
+MMAP_SLICE = 8 * 1024 * 1024
+
+# Rows inserted, fetched or hashed per batch by the streaming engine.
+STREAM_BATCH = 4096
+
+# SQLite page cache of the streaming engine in KiB; larger scans spill to a
+# temporary file on disk.
+STREAM_CACHE_KIB = 32 * 1024
+
+STREAM_SCHEMA = """
+CREATE TABLE dirs (id INTEGER PRIMARY KEY, path TEXT NOT NULL);
+CREATE TABLE files (
+    seq INTEGER PRIMARY KEY,
+    dir INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    alias_of INTEGER,
+    partial TEXT,
+    full TEXT
+);
+"""
+
+
+def file_hash(path, chunk_size=8192, algo="sha256", mmap_threshold=None):
+    """Compute the hash of a file (SHA256 by default).
+
+    algo names one of HASH_BACKENDS. Files of at least mmap_threshold bytes
+    are hashed straight from a memory map instead of being copied through
+    f.read().
+    """
+    h = HASH_BACKENDS[algo]()
     try:
         with open(path, "rb") as f:
-            while chunk := f.read(chunk_size):
-                sha.update(chunk)
+            size = os.fstat(f.fileno()).st_size
+            if mmap_threshold is not None and size and size >= mmap_threshold:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    with memoryview(m) as view:
+                        for start in range(0, size, MMAP_SLICE):
+                            h.update(view[start : start + MMAP_SLICE])
+            else:
+                while chunk := f.read(chunk_size):
+                    h.update(chunk)
     except Exception as e:
         print(f"Error reading {path}: {e}")
         return None
-    return sha.hexdigest()
-
-def remove_duplicates(folder, recursive=True, dry_run=True):
-    """Remove duplicate files in a folder based on file content."""
-    seen_hashes = {}
-    duplicates = []
-
-    for root, _, files in os.walk(folder):
-        for filename in files:
-            filepath = os.path.join(root, filename)
-            filehash = file_hash(filepath)
-            if not filehash:
-                continue
+    return h.hexdigest()
+
 
-            if filehash in seen_hashes:
-                duplicates.append(filepath)
+def partial_hash(path, size, edge=PARTIAL_BYTES, algo="sha256"):
+    """Hash the first and last `edge` bytes of a file.
+
+    Returns (digest, bytes_read). Files no larger than 2 * edge are read
+    whole, so their partial digest already covers the full content.
+    """
+    h = HASH_BACKENDS[algo]()
+    read = 0
+    try:
+        with open(path, "rb") as f:
+            if size <= 2 * edge:
+                data = f.read()
+                h.update(data)
+                read += len(data)
             else:
-                seen_hashes[filehash] = filepath
+                head = f.read(edge)
+                f.seek(-edge, os.SEEK_END)
+                tail = f.read(edge)
+                h.update(head)
+                h.update(tail)
+                read += len(head) + len(tail)
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        return None, read
+    return h.hexdigest(), read
 
-        if not recursive:
-            break
 
-    # Summary
-    print(f"\nFound {len(duplicates)} duplicate files.")
+def adaptive_chunk_size(size):
+    """Pick a read size that grows with the file, within fixed bounds."""
+    return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, size // 16))
+
+
+def _partial_job(job):
+    path, size, edge, algo = job
+    return partial_hash(path, size, edge, algo)
+
+
+def _full_job(job):
+    path, size, chunk_size, algo, mmap_threshold = job
+    digest = file_hash(path, chunk_size, algo, mmap_threshold)
+    return digest, size if digest else 0
+
+
+def hash_pool(workers, processes=False, max_open=MAX_OPEN_FILES):
+    """Create a reusable pool for hash_map, or None when workers is 0."""
+    if not workers:
+        return None
+    workers = min(workers, max_open)
+    if processes:
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def hash_map(
+    func, jobs, workers=0, processes=False, max_open=MAX_OPEN_FILES, pool=None
+):
+    """Run func over jobs and return the results in job order.
+
+    workers=0 runs in the calling thread. Otherwise a thread pool (or a
+    process pool with processes=True) is used. Every worker holds at most
+    one file open, so the pool is capped at max_open workers. An existing
+    pool from hash_pool can be passed in to reuse it across calls.
+    """
+    if pool is not None:
+        return list(pool.map(func, jobs))
+    if not workers or len(jobs) < 2:
+        return [func(job) for job in jobs]
+
+    workers = min(workers, max_open, len(jobs))
+    if processes:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(func, jobs, chunksize=chunksize))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, jobs))
+
+
+def _roots(folder):
+    """Accept a single folder or a list of folders."""
+    return [folder] if isinstance(folder, (str, os.PathLike)) else list(folder)
+
+
+def walk_files(folder, recursive=True):
+    """Yield file paths under folder (or each of a list of folders) in
+    os.walk order."""
+    for top in _roots(folder):
+        for root, _, files in os.walk(top):
+            for filename in files:
+                yield os.path.join(root, filename)
+
+            if not recursive:
+                break
+
+
+def make_filter(min_size=0, include=(), exclude=(), skip_dirs=()):
+    """Build an accept(path, size) predicate for the duplicate finders.
+
+    include and exclude are glob patterns matched against the file name and
+    the full path; a file must match some include pattern (if any are given)
+    and no exclude pattern. Files under any of skip_dirs are rejected too.
+    Returns None when nothing would be filtered.
+    """
+    if not (min_size or include or exclude or skip_dirs):
+        return None
+    skip_dirs = tuple(os.path.join(os.path.abspath(d), "") for d in skip_dirs)
+
+    def matches(path, patterns):
+        name = os.path.basename(path)
+        return any(
+            fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(path, pattern)
+            for pattern in patterns
+        )
+
+    def accept(path, size):
+        if size < min_size:
+            return False
+        if skip_dirs and os.path.abspath(path).startswith(skip_dirs):
+            return False
+        if include and not matches(path, include):
+            return False
+        return not (exclude and matches(path, exclude))
+
+    return accept
 
-    # Delete duplicates
-    for dup in duplicates:
-        if dry_run:
-            print(f"[DRY RUN] Would remove: {dup}")
+
+def _new_stats():
+    return {
+        "size": {"files": 0, "bytes": 0, "cached": 0, "hardlinks": 0, "seconds": 0},
+        "partial": {"files": 0, "bytes": 0, "cached": 0, "seconds": 0},
+        "full": {"files": 0, "bytes": 0, "cached": 0, "seconds": 0},
+        "confirm": {"files": 0, "bytes": 0, "cached": 0, "seconds": 0},
+    }
+
+
+@contextlib.contextmanager
+def _timed(stage):
+    """Add the wall time of the block to stage["seconds"]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage["seconds"] += time.perf_counter() - start
+
+
+def _hash_stage(func, jobs, kind, stage, workers, processes, index, stats_of):
+    """Run one hashing stage, serving unchanged files from the index."""
+    if index is None:
+        return hash_map(func, jobs, workers, processes)
+
+    results = [None] * len(jobs)
+    misses = []
+    for i, job in enumerate(jobs):
+        digest = index.get(stats_of[job[0]], kind)
+        if digest is None:
+            misses.append(i)
         else:
+            results[i] = (digest, 0)
+            stage["cached"] += 1
+
+    computed = hash_map(func, [jobs[i] for i in misses], workers, processes)
+    for i, result in zip(misses, computed):
+        results[i] = result
+        if result[0] is not None:
+            index.put(stats_of[jobs[i][0]], kind, result[0])
+    return results
+
+
+def find_duplicates_staged(
+    folder,
+    recursive=True,
+    edge=PARTIAL_BYTES,
+    workers=0,
+    processes=False,
+    index=None,
+    algo="sha256",
+    confirm=None,
+    mmap_threshold=MMAP_THRESHOLD,
+    accept=None,
+):
+    """Find duplicate files with a size -> partial-hash -> full-hash pipeline.
+
+    Only files sharing a size are partially hashed, and only files whose
+    partial digests still collide are read in full. With workers > 0 the
+    hashing stages run on a pool (see hash_map) using adaptive read sizes;
+    the groups returned are identical to the serial run. If a HashIndex is
+    given, digests of files unchanged since the last scan are reused and
+    only new or modified files are read.
+
+    algo picks the backend for the partial and full stages. Matches found
+    with a non-cryptographic backend are re-hashed with confirm (BLAKE2b by
+    default) before being reported.
+
+    folder may also be a list of folders. accept, e.g. from make_filter,
+    decides which files take part.
+
+    Returns (groups, stats). Each group lists identical files in walk order,
+    and stats records how many files and bytes each stage touched and how
+    long it took.
+    """
+    if algo not in HASH_BACKENDS:
+        raise ValueError(f"Unknown or unavailable hash backend: {algo}")
+    if confirm is None and algo in NON_CRYPTO_BACKENDS:
+        confirm = "blake2b"
+
+    stats = _new_stats()
+    order = {}
+    sizes = {}
+    stats_of = {}
+    inodes = {}
+    aliases = {}
+    if index is not None:
+        index.begin_scan()
+
+    def run_stage(func, jobs, kind, stage):
+        with _timed(stats[stage]):
+            results = _hash_stage(
+                func, jobs, kind, stats[stage], workers, processes, index, stats_of
+            )
+            return _collect(jobs, results, stats[stage])
+
+    def full_jobs(groups, algo):
+        jobs = []
+        for group in groups:
+            size = stats_of[group[0]].st_size
+            chunk_size = adaptive_chunk_size(size) if workers else 8192
+            jobs.extend(
+                (path, size, chunk_size, algo, mmap_threshold) for path in group
+            )
+        return jobs
+
+    # Stage 1: size (stat only, no file content read)
+    with _timed(stats["size"]):
+        for path in walk_files(folder, recursive):
+            if index is not None and index.is_index_file(path):
+                continue
             try:
-                os.remove(dup)
-                print(f"Removed: {dup}")
-            except Exception as e:
-                print(f"Failed to remove {dup}: {e}")
+                st = os.stat(path)
+            except OSError as e:
+                print(f"Error reading {path}: {e}")
+                continue
+            if accept is not None and not accept(path, st.st_size):
+                continue
+            stats["size"]["files"] += 1
+            primary = inodes.setdefault((st.st_dev, st.st_ino), path)
+            if primary != path:
+                # Already a hardlink of a file we have seen
+                aliases.setdefault(primary, []).append(path)
+                stats["size"]["hardlinks"] += 1
+                continue
+            order[path] = len(order)
+            stats_of[path] = st
+            sizes.setdefault(st.st_size, []).append(path)
+
+    # Stage 2: partial hash of head and tail
+    jobs = [
+        (path, size, edge, algo)
+        for size, same_size in sizes.items()
+        if len(same_size) > 1
+        for path in same_size
+    ]
+    partials = run_stage(_partial_job, jobs, f"partial:{edge}:{algo}", "partial")
+
+    groups = []
+    unsettled = []
+    for (size, _), same_partial in partials.items():
+        if len(same_partial) < 2:
+            continue
+        if size <= 2 * edge:
+            # The partial read already covered the whole file
+            groups.append(same_partial)
+        else:
+            unsettled.append(same_partial)
+
+    # Stage 3: full hash
+    fulls = run_stage(_full_job, full_jobs(unsettled, algo), f"full:{algo}", "full")
+    groups.extend(group for group in fulls.values() if len(group) > 1)
+
+    # Stage 4: cryptographic confirmation of fast-hash matches
+    if confirm is not None and confirm != algo:
+        jobs = full_jobs(groups, confirm)
+        confirmed = run_stage(_full_job, jobs, f"full:{confirm}", "confirm")
+        groups = [group for group in confirmed.values() if len(group) > 1]
+
+    if index is not None:
+        index.flush()
+
+    groups.sort(key=lambda group: order[group[0]])
+    return _expand_aliases(groups, aliases), stats
+
+
+def _collect(jobs, results, stage):
+    """Group job paths by (size, digest) and add the reads to stage."""
+    groups = {}
+    for (path, size, *_), (digest, read) in zip(jobs, results):
+        stage["files"] += 1
+        stage["bytes"] += read
+        if digest is not None:
+            groups.setdefault((size, digest), []).append(path)
+    return groups
+
+
+def _expand_aliases(groups, aliases):
+    """Add hardlinks of each duplicate to its group.
+
+    Hardlinks of the kept file share its inode and are not duplicates, so
+    they are left out.
+    """
+    if not aliases:
+        return groups
+    expanded = []
+    for keep, *dups in groups:
+        group = [keep]
+        for dup in dups:
+            group.append(dup)
+            group.extend(aliases.get(dup, ()))
+        expanded.append(group)
+    return expanded
+
+
+def find_duplicates_serial(folder, recursive=True, accept=None):
+    """Find duplicate files by fully hashing every file.
+
+    Returns (groups, stats) in the same shape as find_duplicates_staged.
+    """
+    stats = _new_stats()
+    by_hash = {}
+    inodes = {}
+    aliases = {}
+
+    start = time.perf_counter()
+    for filepath in walk_files(folder, recursive):
+        try:
+            st = os.stat(filepath)
+        except OSError as e:
+            print(f"Error reading {filepath}: {e}")
+            continue
+        if accept is not None and not accept(filepath, st.st_size):
+            continue
+        stats["size"]["files"] += 1
+        primary = inodes.setdefault((st.st_dev, st.st_ino), filepath)
+        if primary != filepath:
+            aliases.setdefault(primary, []).append(filepath)
+            stats["size"]["hardlinks"] += 1
+            continue
+
+        filehash = file_hash(filepath)
+        stats["full"]["files"] += 1
+        if not filehash:
+            continue
+        stats["full"]["bytes"] += st.st_size
+        by_hash.setdefault(filehash, []).append(filepath)
+
+    stats["full"]["seconds"] = time.perf_counter() - start
+
+    groups = [group for group in by_hash.values() if len(group) > 1]
+    return _expand_aliases(groups, aliases), stats
+
+
+def scandir_files(folder, recursive=True):
+    """Yield (directory, name, stat) for files under folder in os.walk order.
+
+    Directory checks come from the os.scandir listing and each file is
+    stat'ed once through the cached DirEntry.stat(). folder may also be a
+    list of folders.
+    """
+    stack = _roots(folder)[::-1]
+    while stack:
+        root = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file():
+                            yield root, entry.name, entry.stat()
+                    except OSError as e:
+                        print(f"Error reading {entry.path}: {e}")
+        except OSError as e:
+            print(f"Error reading {root}: {e}")
+            continue
+
+        if recursive:
+            stack.extend(reversed(subdirs))
+
+
+def _stream_rows(conn, sql, params):
+    """Yield (seq, path, *rest) rows in seq order, one page at a time.
+
+    sql must select seq, dir path and name first, filter on "f.seq > ?" as
+    its last parameter and end with "ORDER BY f.seq LIMIT ?". Paging keeps
+    no cursor open while the caller writes to the table.
+    """
+    last = -1
+    while True:
+        rows = conn.execute(sql, (*params, last, STREAM_BATCH)).fetchall()
+        if not rows:
+            return
+        for seq, root, name, *rest in rows:
+            yield (seq, os.path.join(root, name), *rest)
+        last = rows[-1][0]
+
+
+def _batches(iterable, n=STREAM_BATCH):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _stream_hash(conn, rows, column, job, func, stage, pool):
+    """Hash rows page by page and store the digests in column."""
+    with _timed(stage):
+        for batch in _batches(rows):
+            jobs = [job(path) for _, path, *_ in batch]
+            results = hash_map(func, jobs, pool=pool)
+            updates = []
+            for (seq, *_), (digest, read) in zip(batch, results):
+                stage["files"] += 1
+                stage["bytes"] += read
+                updates.append((digest, seq))
+            conn.executemany(f"UPDATE files SET {column} = ? WHERE seq = ?", updates)
+
+
+def iter_duplicates_streaming(
+    folder,
+    recursive=True,
+    edge=PARTIAL_BYTES,
+    workers=0,
+    processes=False,
+    algo="sha256",
+    confirm=None,
+    mmap_threshold=MMAP_THRESHOLD,
+    stats=None,
+    accept=None,
+):
+    """Yield duplicate groups with memory use bounded by the batch size.
+
+    Files are walked with os.scandir and recorded in a temporary SQLite
+    database that keeps directories and names separately and spills to disk
+    once STREAM_CACHE_KIB is exceeded. Each size class is then narrowed
+    down by partial and full hashes, and its groups are yielded as soon as
+    the class is done. Groups follow the rules of find_duplicates_staged
+    (including folder lists and accept) but come out ordered by size rather
+    than walk order. Pass a dict from _new_stats() as stats to collect the
+    per-stage counters.
+    """
+    if algo not in HASH_BACKENDS:
+        raise ValueError(f"Unknown or unavailable hash backend: {algo}")
+    if confirm is None and algo in NON_CRYPTO_BACKENDS:
+        confirm = "blake2b"
+    if stats is None:
+        stats = _new_stats()
+
+    conn = sqlite3.connect("")
+    conn.execute(f"PRAGMA cache_size = -{STREAM_CACHE_KIB}")
+    conn.executescript(STREAM_SCHEMA)
+    pool = hash_pool(workers, processes)
+    try:
+        # Stage 1: size. scandir_files finishes one directory before the
+        # next, so only the current directory id needs to be remembered.
+        with _timed(stats["size"]):
+            current_dir = dir_id = None
+            rows = []
+            for root, name, st in scandir_files(folder, recursive):
+                path = os.path.join(root, name)
+                if accept is not None and not accept(path, st.st_size):
+                    continue
+                stats["size"]["files"] += 1
+                if root != current_dir:
+                    current_dir = root
+                    dir_id = conn.execute(
+                        "INSERT INTO dirs (path) VALUES (?)", (root,)
+                    ).lastrowid
+                rows.append((dir_id, name, st.st_size, st.st_dev, st.st_ino))
+                if len(rows) >= STREAM_BATCH:
+                    _insert_files(conn, rows)
+            _insert_files(conn, rows)
+
+            conn.executescript(
+                """
+                CREATE INDEX files_inode ON files (dev, ino, seq);
+                UPDATE files SET alias_of = (
+                    SELECT MIN(seq) FROM files AS f
+                    WHERE f.dev = files.dev AND f.ino = files.ino
+                );
+                UPDATE files SET alias_of = NULL WHERE alias_of = seq;
+                CREATE INDEX files_alias ON files (alias_of);
+                CREATE INDEX files_size ON files (size, alias_of);
+                """
+            )
+            stats["size"]["hardlinks"] = conn.execute(
+                "SELECT COUNT(*) FROM files WHERE alias_of IS NOT NULL"
+            ).fetchone()[0]
+
+        for size in _candidate_sizes(conn):
+            yield from _stream_size_class(
+                conn, size, edge, algo, confirm, mmap_threshold, stats, pool
+            )
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        conn.close()
+
+
+def _insert_files(conn, rows):
+    conn.executemany(
+        "INSERT INTO files (dir, name, size, dev, ino) VALUES (?, ?, ?, ?, ?)", rows
+    )
+    rows.clear()
+
+
+def _candidate_sizes(conn):
+    """Yield sizes shared by at least two distinct inodes, in pages."""
+    last = -1
+    while True:
+        sizes = conn.execute(
+            "SELECT size FROM files WHERE alias_of IS NULL AND size > ? "
+            "GROUP BY size HAVING COUNT(*) > 1 ORDER BY size LIMIT ?",
+            (last, STREAM_BATCH),
+        ).fetchall()
+        if not sizes:
+            return
+        for (size,) in sizes:
+            yield size
+        last = sizes[-1][0]
+
+
+FILE_ROWS = (
+    "SELECT f.seq, d.path, f.name{extra} FROM files AS f "
+    "JOIN dirs AS d ON d.id = f.dir "
+    "WHERE f.size = ? AND f.alias_of IS NULL{where} AND f.seq > ? "
+    "ORDER BY f.seq LIMIT ?"
+)
+
+
+def _stream_size_class(conn, size, edge, algo, confirm, mmap_threshold, stats, pool):
+    """Hash one size class and yield its duplicate groups."""
+    # Stage 2: partial hash of head and tail
+    rows = _stream_rows(conn, FILE_ROWS.format(extra="", where=""), (size,))
+    _stream_hash(
+        conn,
+        rows,
+        "partial",
+        lambda path: (path, size, edge, algo),
+        _partial_job,
+        stats["partial"],
+        pool,
+    )
+
+    # Stage 3: full hash
+    if size <= 2 * edge:
+        # The partial read already covered the whole file
+        conn.execute("UPDATE files SET full = partial WHERE size = ?", (size,))
+    else:
+        colliding = (
+            " AND f.partial IN (SELECT partial FROM files WHERE size = ? "
+            "AND alias_of IS NULL GROUP BY partial HAVING COUNT(*) > 1)"
+        )
+        chunk_size = adaptive_chunk_size(size) if pool else 8192
+        rows = _stream_rows(
+            conn, FILE_ROWS.format(extra="", where=colliding), (size, size)
+        )
+        _stream_hash(
+            conn,
+            rows,
+            "full",
+            lambda path: (path, size, chunk_size, algo, mmap_threshold),
+            _full_job,
+            stats["full"],
+            pool,
+        )
+
+    # Emit groups of equal full digests, one group in memory at a time
+    cursor = conn.execute(
+        "SELECT f.full, f.seq, d.path, f.name FROM files AS f "
+        "JOIN dirs AS d ON d.id = f.dir "
+        "WHERE f.size = ? AND f.alias_of IS NULL AND f.full IN ("
+        "SELECT full FROM files WHERE size = ? AND alias_of IS NULL "
+        "GROUP BY full HAVING COUNT(*) > 1) ORDER BY f.full, f.seq",
+        (size, size),
+    ).fetchmany
+    group = []
+    current = None
+    while rows := cursor(STREAM_BATCH):
+        for digest, seq, root, name in rows:
+            if digest != current and group:
+                yield from _finish_group(
+                    conn, group, size, confirm, mmap_threshold, stats, pool
+                )
+                group = []
+            current = digest
+            group.append((seq, os.path.join(root, name)))
+    if group:
+        yield from _finish_group(
+            conn, group, size, confirm, mmap_threshold, stats, pool
+        )
+
+
+def _finish_group(conn, group, size, confirm, mmap_threshold, stats, pool):
+    """Confirm a group if needed and add hardlinks of its duplicates."""
+    groups = [group]
+    if confirm is not None:
+        chunk_size = adaptive_chunk_size(size) if pool else 8192
+        jobs = [
+            (path, size, chunk_size, confirm, mmap_threshold) for _, path in group
+        ]
+        with _timed(stats["confirm"]):
+            results = hash_map(_full_job, jobs, pool=pool)
+        # Group the (seq, path) items themselves rather than bare paths
+        confirmed = _collect(
+            [(item, size) for item in group], results, stats["confirm"]
+        )
+        groups = list(confirmed.values())
+
+    for (_, keep), *dups in groups:
+        if not dups:
+            continue
+        paths = [keep]
+        for seq, dup in dups:
+            paths.append(dup)
+            paths.extend(
+                os.path.join(root, name)
+                for root, name in conn.execute(
+                    "SELECT d.path, f.name FROM files AS f "
+                    "JOIN dirs AS d ON d.id = f.dir "
+                    "WHERE f.alias_of = ? ORDER BY f.seq",
+                    (seq,),
+                )
+            )
+        yield paths
+
+
+def stream_duplicates(
+    folder,
+    out,
+    recursive=True,
+    dry_run=True,
+    action=None,
+    quarantine_dir=None,
+    **options,
+):
+    """Stream the duplicate groups of folder to out as JSON Lines.
+
+    Each group is written and flushed as soon as iter_duplicates_streaming
+    yields it, and action (one of ACTIONS) is applied to it right away if
+    given. Extra options go to iter_duplicates_streaming. Returns the
+    per-stage stats.
+    """
+    if action is not None:
+        _check_action(action, quarantine_dir)
+
+    stats = _new_stats()
+    for keep, *dups in iter_duplicates_streaming(
+        folder, recursive, stats=stats, **options
+    ):
+        out.write(json.dumps({"keep": keep, "duplicates": dups}) + "\n")
+        out.flush()
+        if action is not None:
+            _apply_action(keep, dups, action, dry_run, quarantine_dir)
+    return stats
+
+
+def print_stage_report(stats):
+    """Print the files and bytes read by each stage, and its wall time."""
+    print(
+        f"\n{'Stage':<10}{'Files':>12}{'Cached':>10}{'Bytes read':>18}"
+        f"{'Seconds':>10}"
+    )
+    for stage, counts in stats.items():
+        print(
+            f"{stage:<10}{counts['files']:>12}{counts['cached']:>10}"
+            f"{counts['bytes']:>18}{counts['seconds']:>10.3f}"
+        )
+    if stats["size"]["hardlinks"]:
+        print(f"Skipped {stats['size']['hardlinks']} paths already hardlinked.")
+
+
+def reflink(src, dst):
+    """Create dst as a copy-on-write clone of src.
+
+    Uses the Linux FICLONE ioctl; raises OSError where the platform or
+    filesystem does not support reflinks.
+    """
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src, "rb") as s, open(dst, "xb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except BaseException:
+            os.remove(dst)
+            raise
+
+
+def link_duplicate(keep, dup, mode="hardlink"):
+    """Atomically replace dup with a hardlink or reflink to keep.
+
+    The link is created under a unique temporary name in dup's directory
+    and then renamed over dup, so dup is never missing.
+    """
+    tmp = os.path.join(
+        os.path.dirname(dup), f".{os.path.basename(dup)}.{uuid.uuid4().hex}.dup-tmp"
+    )
+    created = False
+    try:
+        if mode == "hardlink":
+            os.link(keep, tmp)
+        elif mode == "reflink":
+            reflink(keep, tmp)
+        else:
+            raise ValueError(f"Unknown link mode: {mode}")
+        created = True
+        if mode == "reflink":
+            shutil.copystat(dup, tmp)
+        os.replace(tmp, dup)
+    except BaseException:
+        # Only ever remove a file this call made
+        if created:
+            os.remove(tmp)
+        raise
+
+
+def quarantine_file(path, quarantine_dir):
+    """Move path into quarantine_dir, mirroring its absolute path there.
+
+    Returns the new location.
+    """
+    drive, tail = os.path.splitdrive(os.path.abspath(path))
+    dest = os.path.join(quarantine_dir, drive.strip(":\\/"), tail.lstrip("\\/"))
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    shutil.move(path, dest)
+    return dest
+
+
+def remove_duplicates(
+    folder,
+    recursive=True,
+    dry_run=True,
+    staged=True,
+    workers=0,
+    processes=False,
+    use_index=False,
+    action="delete",
+    algo="sha256",
+    quarantine_dir=None,
+):
+    """Remove duplicate files in a folder based on file content.
+
+    With staged=True (the default) files are narrowed down by size and a
+    partial hash before being fully hashed; staged=False hashes every file.
+    workers > 0 hashes concurrently on a thread pool, or a process pool with
+    processes=True. use_index=True keeps a HashIndex inside the folder so
+    re-scans only read new or modified files. The first file of each group
+    in walk order is kept; action="hardlink" or "reflink" replaces the other
+    files with links to it instead of deleting them, and "quarantine" moves
+    them under quarantine_dir. algo selects the hash backend used by the
+    staged engine.
+    """
+    _check_action(action, quarantine_dir)
+
+    if staged and use_index:
+        with HashIndex.for_root(folder) as index:
+            groups, stats = find_duplicates_staged(
+                folder,
+                recursive,
+                workers=workers,
+                processes=processes,
+                index=index,
+                algo=algo,
+            )
+    elif staged:
+        groups, stats = find_duplicates_staged(
+            folder, recursive, workers=workers, processes=processes, algo=algo
+        )
+    else:
+        groups, stats = find_duplicates_serial(folder, recursive)
+
+    duplicates = [path for group in groups for path in group[1:]]
+
+    # Summary
+    print(f"\nFound {len(duplicates)} duplicate files.")
+    print_stage_report(stats)
+
+    for keep, *dups in groups:
+        _apply_action(keep, dups, action, dry_run, quarantine_dir)
 
     print("\nDone.")
     return duplicates
 
 
-if __name__ == "__main__":
-    folder_path = input("Enter folder path: ").strip()
-    confirm = input("Dry run? (y/n): ").strip().lower() != "n"
-    remove_duplicates(folder_path, dry_run=confirm)
+def _check_action(action, quarantine_dir=None):
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown action: {action}")
+    if action == "quarantine" and not quarantine_dir:
+        raise ValueError("The quarantine action needs a quarantine_dir")
+
+
+def _apply_action(keep, dups, action, dry_run, quarantine_dir=None):
+    for dup in dups:
+        if action == "delete":
+            _remove(dup, dry_run)
+        elif action == "quarantine":
+            _quarantine(dup, quarantine_dir, dry_run)
+        else:
+            _link(keep, dup, action, dry_run)
+
+
+def _remove(dup, dry_run):
+    if dry_run:
+        print(f"[DRY RUN] Would remove: {dup}")
+        return
+    try:
+        os.remove(dup)
+        print(f"Removed: {dup}")
+    except Exception as e:
+        print(f"Failed to remove {dup}: {e}")
+
+
+def _link(keep, dup, mode, dry_run):
+    if dry_run:
+        print(f"[DRY RUN] Would {mode}: {dup} -> {keep}")
+        return
+    try:
+        link_duplicate(keep, dup, mode)
+        print(f"Linked ({mode}): {dup} -> {keep}")
+    except Exception as e:
+        print(f"Failed to {mode} {dup}: {e}")
+
+
+def _quarantine(dup, quarantine_dir, dry_run):
+    if dry_run:
+        print(f"[DRY RUN] Would quarantine: {dup}")
+        return
+    try:
+        dest = quarantine_file(dup, quarantine_dir)
+        print(f"Quarantined: {dup} -> {dest}")
+    except Exception as e:
+        print(f"Failed to quarantine {dup}: {e}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Find duplicate files and report, delete, link or "
+        "quarantine them."
+    )
+    parser.add_argument(
+        "roots", nargs="*", help="folders to scan (prompted for when omitted)"
+    )
+    parser.add_argument(
+        "--no-recursive",
+        dest="recursive",
+        action="store_false",
+        help="only scan the top level of each root",
+    )
+    parser.add_argument(
+        "--min-size", type=int, default=0, help="skip files smaller than this"
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="only scan matching files (repeatable)",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="skip matching files (repeatable)",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=("exact", "image", "chunks"),
+        default="exact",
+        help="identical files, similar images, or shared chunks",
+    )
+    parser.add_argument(
+        "--action",
+        choices=("report", "delete", "link", "quarantine"),
+        default="report",
+    )
+    parser.add_argument(
+        "--reflink", action="store_true", help="link with reflinks, not hardlinks"
+    )
+    parser.add_argument("--quarantine-dir", metavar="DIR")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="show what the action would do"
+    )
+    parser.add_argument(
+        "--engine", choices=("staged", "serial", "stream"), default="staged"
+    )
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument(
+        "--processes", action="store_true", help="hash on processes, not threads"
+    )
+    parser.add_argument("--algo", choices=sorted(HASH_BACKENDS), default="sha256")
+    parser.add_argument(
+        "--index", metavar="PATH", help="SQLite hash index reused across runs"
+    )
+    parser.add_argument(
+        "--compact-index",
+        action="store_true",
+        help="drop index entries this run did not use",
+    )
+    parser.add_argument(
+        "--image-hash", choices=("ahash", "dhash", "phash"), default="dhash"
+    )
+    parser.add_argument("--max-distance", type=int, default=4)
+    parser.add_argument(
+        "--json",
+        metavar="PATH",
+        help="write a machine-readable report ('-' for stdout); the stream "
+        "engine writes one JSON line per group followed by a summary line",
+    )
+    return parser
+
+
+def _group_report(groups):
+    report = []
+    for keep, *dups in groups:
+        # Reclaimable bytes: hardlinks share one inode, and links of the
+        # kept file free nothing
+        seen = set()
+        with contextlib.suppress(OSError):
+            st = os.stat(keep)
+            seen.add((st.st_dev, st.st_ino))
+        size = 0
+        for dup in dups:
+            try:
+                st = os.stat(dup)
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                size += st.st_size
+        report.append({"keep": keep, "duplicates": dups, "bytes": size})
+    return report
+
 
+def _run_exact(args, accept, action):
+    options = dict(
+        workers=args.workers,
+        processes=args.processes,
+        algo=args.algo,
+        accept=accept,
+    )
+    if args.engine == "serial":
+        groups, stats = find_duplicates_serial(args.roots, args.recursive, accept)
+    elif args.index:
+        with HashIndex(args.index) as index:
+            groups, stats = find_duplicates_staged(
+                args.roots, args.recursive, index=index, **options
+            )
+            if args.compact_index:
+                print(f"Compacted index: {index.compact()} entries removed.")
+    else:
+        groups, stats = find_duplicates_staged(args.roots, args.recursive, **options)
+
+    report = _group_report(groups)
+    print(f"\nFound {sum(len(g['duplicates']) for g in report)} duplicate files.")
+    print_stage_report(stats)
+    for group in report:
+        if action is None:
+            print(f"\n{group['keep']}")
+            for dup in group["duplicates"]:
+                print(f"  = {dup}")
+        else:
+            _apply_action(
+                group["keep"],
+                group["duplicates"],
+                action,
+                args.dry_run,
+                args.quarantine_dir,
+            )
+    return {"stats": stats, "groups": report}
+
+
+def _run_stream(args, accept, action, out):
+    stats = stream_duplicates(
+        args.roots,
+        out,
+        args.recursive,
+        args.dry_run,
+        action,
+        args.quarantine_dir,
+        workers=args.workers,
+        processes=args.processes,
+        algo=args.algo,
+        accept=accept,
+    )
+    print_stage_report(stats)
+    return {"stats": stats}
+
+
+def _run_images(args, accept, action):
+    from image_hash import find_similar_images
+
+    # All roots at once, so similar images in different roots are grouped
+    groups = find_similar_images(
+        args.roots,
+        args.recursive,
+        args.image_hash,
+        args.max_distance,
+        workers=args.workers,
+        accept=accept,
+    )
+    report = _group_report(groups)
+    for group in report:
+        print(f"\n{group['keep']}")
+        for dup in group["duplicates"]:
+            print(f"  ~ {dup}")
+        if action is not None:
+            _apply_action(
+                group["keep"],
+                group["duplicates"],
+                action,
+                args.dry_run,
+                args.quarantine_dir,
+            )
+    return {"groups": report}
+
+
+def _run_chunks(args, accept):
+    from chunking import ChunkIndex, analyze_folder, print_chunk_report
+
+    with ChunkIndex() as index:
+        for root in args.roots:
+            analyze_folder(
+                root, args.recursive, index, accept=accept, workers=args.workers
+            )
+        print_chunk_report(index)
+        return {
+            "summary": index.summary(),
+            "pairs": [
+                {"a": a, "b": b, "shared_bytes": shared}
+                for a, b, shared in index.pair_report()
+            ],
+        }
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if not args.roots:
+        # Interactive fallback for running the script without arguments
+        args.roots = [input("Enter folder path: ").strip()]
+        args.dry_run = input("Dry run? (y/n): ").strip().lower() != "n"
+        args.action = "delete"
+
+    action = {
+        "report": None,
+        "link": "reflink" if args.reflink else "hardlink",
+    }.get(args.action, args.action)
+    if action == "quarantine" and not args.quarantine_dir:
+        parser.error("--action quarantine needs --quarantine-dir")
+    if args.mode == "image" and action in ("hardlink", "reflink"):
+        parser.error("similar images differ in content and cannot be linked")
+    if args.mode == "chunks" and action is not None:
+        parser.error("--mode chunks only reports")
+    if args.engine == "stream" and (args.index or args.compact_index):
+        parser.error("the stream engine keeps no hash index")
+    if args.compact_index and not args.index:
+        parser.error("--compact-index needs --index")
+
+    skip_dirs = [args.quarantine_dir] if args.quarantine_dir else []
+    accept = make_filter(args.min_size, args.include, args.exclude, skip_dirs)
+
+    if args.json == "-":
+        out = sys.stdout
+    elif args.json:
+        out = open(args.json, "w")
+    elif args.mode == "exact" and args.engine == "stream":
+        # The stream engine always writes its groups as JSON lines
+        out = sys.stdout
+    else:
+        out = None
+
+    # Keep stdout clean when the JSON report goes there
+    if out is sys.stdout:
+        chatter = contextlib.redirect_stdout(sys.stderr)
+    else:
+        chatter = contextlib.nullcontext()
+
+    start = time.perf_counter()
+    try:
+        with chatter:
+            if args.mode == "image":
+                report = _run_images(args, accept, action)
+            elif args.mode == "chunks":
+                report = _run_chunks(args, accept)
+            elif args.engine == "stream":
+                report = _run_stream(args, accept, action, out)
+            else:
+                report = _run_exact(args, accept, action)
+
+        report = {
+            "roots": args.roots,
+            "mode": args.mode,
+            "engine": args.engine,
+            "action": args.action,
+            "dry_run": args.dry_run,
+            "elapsed": time.perf_counter() - start,
+            **report,
+        }
+        if out is not None and args.mode == "exact" and args.engine == "stream":
+            out.write(json.dumps({"summary": report}) + "\n")
+        elif out is not None:
+            json.dump(report, out, indent=2)
+            out.write("\n")
+    finally:
+        if out is not None and out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
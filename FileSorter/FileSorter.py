@@ -1,10 +1,45 @@
 import string
 import os
-import shutil
+import errno
+import json
+import argparse
+import cProfile
+import pstats
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
+from layout import DestIndex, Shard
+from rules import RuleSet
+from sniff import SniffCache, sniff_many
+from transfer import (
+    JOURNAL_NAME,
+    Journal,
+    make_folders,
+    move_file,
+    rename_noreplace,
+)
+from watch import Watcher
+
+# One planned move. conflict is set when dest had to be renamed because the
+# original name was taken; cross_device when src and dest are on different
+# filesystems and the file must be copied.
+Move = namedtuple("Move", "src dest category conflict cross_device")
+
+
+class _OnDisk:
+    """Names taken on disk (or already tried), for _free_name at apply time."""
 
-class FileSorter:
     def __init__(self):
+        self.tried = set()
+
+    def __contains__(self, path):
+        return path in self.tried or os.path.lexists(path)
+
+
+class FileSorter:
+    def __init__(self, rules=None):
+        """rules is an optional list of rules.Rule or the path of a JSON
+        rules file; they take priority over the extension table."""
         self.extensions = {
             # Audio
             ".mp3": "audio",
@@ -111,30 +146,428 @@ class FileSorter:
             ".tmp": "temporary",
             ".swp": "temporary",
         }
+        if isinstance(rules, str):
+            self.rules = RuleSet.from_file(rules, self.extensions)
+        else:
+            self.rules = RuleSet(rules or [], self.extensions)
+
+    def classify(self, path, root=None, st=None):
+        """Return the category for path, or None if no rule matches."""
+        return self.rules.classify(path, root, st)
+
+    def explain(self, path, root=None):
+        """Explain which rules were considered for path and why one won."""
+        return self.rules.explain(path, root)
 
     def get_files(self):
-        files = os.listdir()
+        moves, skipped = self.plan()
+        for path in skipped:
+            _, ext = os.path.splitext(path)
+            print(f"Skipped: {os.path.basename(path)} (unknown extension: '{ext}')")
+        if moves:
+            self.apply(moves)
+        elif not skipped:
+            print("No files to be sorted.")
+
+    def scan(self, source=".", recursive=False, skip_dirs=()):
+        """Yield a DirEntry for every file under source.
+
+        Uses os.scandir so file/dir checks come from the directory listing.
+        Directories in skip_dirs (such as the category folders files are
+        being sorted into) are not entered.
+        """
+        skip_dirs = {os.path.abspath(d) for d in skip_dirs}
+        script = os.path.abspath(__file__)
+        script_name = os.path.basename(script)
+        stack = [source]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and os.path.abspath(entry.path) not in skip_dirs:
+                            stack.append(entry.path)
+                    elif entry.is_file():
+                        if entry.name == script_name:
+                            if os.path.abspath(entry.path) == script:
+                                continue
+                        elif entry.name == JOURNAL_NAME:
+                            continue
+                        yield entry
+
+    def plan(
+        self,
+        source=".",
+        dest=None,
+        recursive=False,
+        sniff=None,
+        sniff_cache=None,
+        entries=None,
+        shard=None,
+        index=None,
+    ):
+        """Work out where every file under source should go.
+
+        Returns (moves, skipped): a list of Move tuples into dest/<category>
+        (dest defaults to source), and the paths with unknown extensions.
+        Nothing on disk is changed.
+
+        sniff="unknown" reads the header of files the rules could not
+        classify and matches it against known magic bytes; sniff="all" also
+        lets a distinctive signature override the extension (a PNG named
+        .txt goes to image). sniff_cache is an optional sniff.SniffCache.
+        entries, if given, are the DirEntry objects to plan instead of a
+        scan of source. shard is a layout.Shard spec such as "date",
+        "hash:2" or "count:1000" that splits each category folder.
+
+        Name conflicts are checked against a layout.DestIndex of the
+        category folders. It is built for the call unless an index of dest
+        from dest_index() is passed in, which is then kept up to date with
+        the planned moves, so repeated plans (watch mode) walk dest once.
+        """
+        dest = source if dest is None else dest
+        dest_dev = os.stat(dest).st_dev
+        categories = self.categories()
+        skip_dirs = [os.path.join(dest, category) for category in categories]
+
+        if entries is None:
+            entries = self.scan(source, recursive, skip_dirs)
+        classified = [
+            (entry, self.classify(entry.path, source, entry.stat))
+            for entry in entries
+        ]
+        if sniff:
+            classified = self._sniff(classified, sniff, sniff_cache)
+
+        shard = shard if isinstance(shard, Shard) else Shard(shard)
+        if index is None:
+            index = DestIndex(dest, categories)
+        moves = []
+        skipped = []
+        for entry, category in classified:
+            if not category:
+                skipped.append(entry.path)
+                continue
+
+            folder = shard.folder(
+                os.path.join(dest, category), entry.name, entry.stat, index
+            )
+            target = os.path.join(folder, entry.name)
+            conflict = target in index
+            if conflict:
+                target = self._free_name(target, index)
+            index.add(target)
 
-        if files:
-            for file in files:
-                if file == os.path.basename(__file__):
+            cross_device = entry.stat(follow_symlinks=False).st_dev != dest_dev
+            moves.append(Move(entry.path, target, category, conflict, cross_device))
+        return moves, skipped
+
+    def categories(self):
+        """The category folder names files can be sorted into."""
+        return {rule.category for rule in self.rules.rules}
+
+    def dest_index(self, dest):
+        """A layout.DestIndex of dest's category folders, for plan()."""
+        return DestIndex(dest, self.categories())
+
+    def _sniff(self, classified, mode, cache=None):
+        """Refine (entry, category) pairs with magic-byte sniffing."""
+        if mode not in ("unknown", "all"):
+            raise ValueError(f"Unknown sniff mode: {mode}")
+        todo = [
+            i
+            for i, (_, category) in enumerate(classified)
+            if mode == "all" or not category
+        ]
+        files = [(classified[i][0].path, classified[i][0].stat()) for i in todo]
+        results = sniff_many(files, cache=cache)
+
+        classified = list(classified)
+        for i, result in zip(todo, results):
+            if result is None:
+                continue
+            entry, category = classified[i]
+            sniffed, _, weak = result
+            if not category or not weak:
+                classified[i] = (entry, sniffed)
+        return classified
+
+    def _free_name(self, target, index):
+        """Return target with the first " (n)" suffix not in the index."""
+        root, ext = os.path.splitext(target)
+        n = 1
+        while True:
+            candidate = f"{root} ({n}){ext}"
+            if candidate not in index:
+                return candidate
+            n += 1
+
+    def apply(self, moves, workers=4, journal=None):
+        """Carry out a plan from plan().
+
+        Same-device moves are renames made in one pass; cross-device moves
+        are copied by a pool of at most `workers` threads. Nothing is ever
+        overwritten: if a file's planned name has been taken since the plan
+        was made, it gets the next free " (n)" name instead. With a
+        transfer.Journal the plan is recorded before anything moves and
+        each move once it is settled, so an interrupted run can be resumed
+        or undone; the journal is then compacted. Returns counts of renamed, copied and failed files.
+        """
+        created = make_folders({os.path.dirname(move.dest) for move in moves})
+        run = journal.begin(moves, created) if journal is not None else None
+        result = {"renamed": 0, "copied": 0, "failed": 0}
+        copies = [(i, move) for i, move in enumerate(moves) if move.cross_device]
+        for i, move in enumerate(moves):
+            if move.cross_device:
+                continue
+            try:
+                dest = self._move_to_free_name(move, rename_noreplace)
+                result["renamed"] += 1
+            except OSError as e:
+                if e.errno == errno.EXDEV:
+                    copies.append((i, move))
                     continue
-                if os.path.isfile(file):
-                    _, ext = os.path.splitext(file)
-                    catagory = self.extensions.get(ext.lower(), None)
-                    if catagory:
-                        if not (os.path.isdir(catagory)):
-                            os.mkdir(catagory)
-                        shutil.move(file, catagory)
-                    else:
-                        print(f"Skipped: {file} (unknown extension: '{ext}')")
-        else:
-            print("No files to be sorted.")
+                print(f"Failed to move {move.src}: {e}")
+                result["failed"] += 1
+                if journal is not None:
+                    journal.failed(run, i)
+                continue
+            if journal is not None:
+                journal.done(run, i, None if dest == move.dest else dest)
+
+        def copy(job):
+            i, move = job
+            dest = self._copy_move(move)
+            if journal is not None:
+                if dest is None:
+                    journal.failed(run, i)
+                else:
+                    journal.done(run, i, None if dest == move.dest else dest)
+            return dest is not None
+
+        if copies:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for ok in pool.map(copy, copies):
+                    result["copied" if ok else "failed"] += 1
+        if journal is not None:
+            # Every move is settled, so older runs can go
+            journal.compact()
+        return result
+
+    def _move_to_free_name(self, move, mover):
+        """mover(src, dest), moving on to the next free name while dest is
+        taken. Returns the dest used."""
+        dest = move.dest
+        taken = _OnDisk()
+        while True:
+            try:
+                mover(move.src, dest)
+            except FileExistsError:
+                taken.tried.add(dest)
+                dest = self._free_name(move.dest, taken)
+                print(f"{move.dest} is taken, using {dest}")
+                continue
+            return dest
+
+    def _copy_move(self, move):
+        """Copy-move one file; returns its dest, or None if it failed."""
+        try:
+            return self._move_to_free_name(move, move_file)
+        except Exception as e:
+            print(f"Failed to move {move.src}: {e}")
+            return None
+
+    def sort(
+        self,
+        source=".",
+        dest=None,
+        recursive=False,
+        dry_run=False,
+        workers=4,
+        sniff=None,
+        sniff_cache=None,
+        journal=None,
+        shard=None,
+    ):
+        """Plan and then apply a sort of source into dest.
+
+        With a journal, moves an earlier run left unfinished are completed
+        first.
+        """
+        if journal is not None and not dry_run:
+            self.report("Resumed", journal.resume())
+        moves, skipped = self.plan(
+            source, dest, recursive, sniff, sniff_cache, shard=shard
+        )
+        conflicts = sum(move.conflict for move in moves)
+        cross_device = sum(move.cross_device for move in moves)
+        print(
+            f"{len(moves)} files to sort ({conflicts} renamed to avoid conflicts, "
+            f"{cross_device} cross-device), {len(skipped)} skipped."
+        )
+        if dry_run:
+            for move in moves:
+                print(f"[DRY RUN] {move.src} -> {move.dest}")
+            return moves
+
+        self.report("Sorted", self.apply(moves, workers, journal))
+        return moves
+
+    def report(self, what, result):
+        """Print the counts returned by apply(), unless all are zero."""
+        if any(result.values()):
+            print(
+                f"{what}: renamed {result['renamed']}, copied {result['copied']}, "
+                f"failed {result['failed']}."
+            )
 
 
 def main():
-    sorter = FileSorter()
-    sorter.get_files()
+    parser = argparse.ArgumentParser(description="Sort files into folders by type.")
+    parser.add_argument("source", nargs="?", default=".", help="folder to sort")
+    parser.add_argument("--dest", help="where category folders go (default: source)")
+    parser.add_argument(
+        "-r", "--recursive", action="store_true", help="also sort subfolders"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="print the plan without moving"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="threads for cross-device copies"
+    )
+    parser.add_argument("--rules", help="JSON file of extra classification rules")
+    parser.add_argument(
+        "--sniff",
+        choices=("unknown", "all"),
+        help="classify by magic bytes: files with unknown extensions, or all files",
+    )
+    parser.add_argument(
+        "--sniff-cache",
+        metavar="PATH",
+        default=SniffCache.default_path(),
+        help="SQLite cache of sniff results (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-sniff-cache", action="store_true", help="do not cache sniff results"
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="SPEC",
+        help="split category folders: date, hash[:LEVELS] or count[:MAX_ENTRIES]",
+    )
+    parser.add_argument(
+        "--watch", action="store_true", help="keep running and sort new arrivals"
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=2.0,
+        help="seconds a file must be unchanged before it is sorted (watch mode)",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=500, help="files sorted per batch"
+    )
+    parser.add_argument(
+        "--poll", action="store_true", help="poll the folder instead of inotify"
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=1.0, help="seconds between polls"
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="PATH",
+        help=f"journal of moves for resume/undo (default: DEST/{JOURNAL_NAME})",
+    )
+    parser.add_argument(
+        "--no-journal", action="store_true", help="do not keep a journal"
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="only finish an interrupted run"
+    )
+    parser.add_argument(
+        "--undo", action="store_true", help="move the last run's files back"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="profile the run with cProfile and write the stats here",
+    )
+    parser.add_argument(
+        "--explain", metavar="FILE", help="show how FILE would be classified"
+    )
+    args = parser.parse_args()
+
+    sorter = FileSorter(args.rules)
+    if args.explain:
+        print(json.dumps(sorter.explain(args.explain, args.source), indent=2))
+        return
+    journal = None
+    if not args.no_journal:
+        dest = args.source if args.dest is None else args.dest
+        journal = Journal(args.journal or os.path.join(dest, JOURNAL_NAME))
+    if args.resume or args.undo:
+        if journal is None:
+            parser.error("--resume and --undo need a journal")
+        with journal:
+            if args.undo:
+                result = journal.undo()
+                if result is None:
+                    print("Nothing to undo.")
+                else:
+                    sorter.report("Undone", result)
+            else:
+                sorter.report("Resumed", journal.resume())
+        return
+
+    try:
+        shard = Shard(args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+
+    cache = None
+    if args.sniff and not args.no_sniff_cache:
+        cache = SniffCache(args.sniff_cache)
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        if args.watch:
+            watcher = Watcher(
+                sorter,
+                args.source,
+                args.dest,
+                args.settle,
+                args.batch_size,
+                args.workers,
+                args.poll,
+                args.poll_interval,
+                args.dry_run,
+                {"sniff": args.sniff, "sniff_cache": cache, "shard": shard},
+                journal,
+            )
+            backend = watcher.stats["backend"]
+            print(f"Watching {args.source} ({backend}), Ctrl-C to stop.")
+            print(json.dumps(watcher.run(), indent=2))
+            return
+        sorter.sort(
+            args.source,
+            args.dest,
+            args.recursive,
+            args.dry_run,
+            args.workers,
+            args.sniff,
+            cache,
+            journal,
+            shard,
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+        if journal is not None:
+            journal.close()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
 
 
 if __name__ == "__main__":
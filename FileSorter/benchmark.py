@@ -0,0 +1,357 @@
+import argparse
+import contextlib
+import cProfile
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from FileSorter import FileSorter
+from transfer import Journal
+
+KIB = 1024
+MIB = 1024 * KIB
+
+# (low, high) byte ranges and their weights for each size distribution.
+SIZE_DISTRIBUTIONS = {
+    "empty": [((0, 0), 1)],
+    "small": [((0, 4 * KIB), 3), ((4 * KIB, 64 * KIB), 1)],
+    "mixed": [
+        ((0, 4 * KIB), 4),
+        ((4 * KIB, 256 * KIB), 3),
+        ((256 * KIB, 4 * MIB), 1),
+    ],
+}
+
+# Extensions the sorter does not know, used for the unknown share of files.
+UNKNOWN_EXTENSIONS = ["", ".xyz", ".dat1", ".part2"]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Audit events (see sys.addaudithook) counted as filesystem calls.
+FS_EVENTS = {"open", "os.listdir", "os.scandir", "os.walk", "shutil.copyfile"}
+
+
+def _random_size(rng, distribution):
+    ranges, weights = zip(*SIZE_DISTRIBUTIONS[distribution])
+    low, high = rng.choices(ranges, weights)[0]
+    return rng.randint(low, high)
+
+
+def build_tree(
+    root,
+    files=5000,
+    unknown_ratio=0.1,
+    distribution="small",
+    depth=2,
+    fanout=4,
+    seed=0,
+):
+    """Fill root with a synthetic tree for benchmarking.
+
+    Extensions are drawn from the sorter's table, except for unknown_ratio
+    of the files, which get an extension it does not know (or none).
+    Returns the total bytes written.
+    """
+    rng = random.Random(seed)
+    known = sorted(FileSorter().extensions)
+    dirs = [root]
+    for level in range(depth):
+        dirs += [
+            os.path.join(d, f"d{level}_{i}")
+            for d in dirs
+            if d.count(os.sep) - root.count(os.sep) == level
+            for i in range(fanout)
+        ]
+    for d in dirs:
+        os.makedirs(d, exist_ok=True)
+
+    total = 0
+    for n in range(files):
+        if rng.random() < unknown_ratio:
+            ext = rng.choice(UNKNOWN_EXTENSIONS)
+        else:
+            ext = rng.choice(known)
+        size = _random_size(rng, distribution)
+        with open(os.path.join(rng.choice(dirs), f"f{n}{ext}"), "wb") as f:
+            f.write(rng.randbytes(size))
+        total += size
+    return total
+
+
+class OpCounter:
+    """Counts audited filesystem operations made by this process while active.
+
+    Metadata calls the interpreter audits (open, scandir, rename, mkdir,
+    remove, ...) come from an audit hook; read and write syscalls come from
+    /proc/self/io where it exists. stat-family calls are not audited and
+    are not counted, which leaves planning, mostly stats, near zero; the
+    --strace option gives exact syscall counts.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.events = 0
+        sys.addaudithook(self._hook)
+
+    def _hook(self, event, args):
+        if self.active and (event in FS_EVENTS or event.startswith("os.")):
+            self.events += 1
+
+    @staticmethod
+    def _io_syscalls():
+        try:
+            with open("/proc/self/io") as f:
+                fields = dict(line.split(": ") for line in f.read().splitlines())
+            return int(fields["syscr"]) + int(fields["syscw"])
+        except (OSError, KeyError, ValueError):
+            return 0
+
+    @contextlib.contextmanager
+    def count(self):
+        """Yield a dict whose "ops" is filled in when the block exits."""
+        result = {}
+        self.events = 0
+        io_before = self._io_syscalls()
+        self.active = True
+        try:
+            yield result
+        finally:
+            self.active = False
+            result["ops"] = self.events + self._io_syscalls() - io_before
+
+
+def _modes(dest, journal_path):
+    """(name, real, callable taking (sorter, root)) for every mode measured."""
+
+    def plan(**options):
+        return lambda sorter, root: sorter.plan(root, dest, True, **options)[0]
+
+    def sort(journal=False, **options):
+        def run(sorter, root):
+            moves = sorter.plan(root, dest, True, **options)[0]
+            if journal:
+                with Journal(journal_path) as j:
+                    sorter.apply(moves, journal=j)
+            else:
+                sorter.apply(moves)
+            return moves
+
+        return run
+
+    return [
+        ("plan", False, plan()),
+        ("plan sniff", False, plan(sniff="unknown")),
+        ("plan shard=hash:2", False, plan(shard="hash:2")),
+        ("sort", True, sort()),
+        ("sort journal", True, sort(journal=True)),
+        ("sort shard=count:500", True, sort(shard="count:500")),
+    ]
+
+
+def _run_mode(name, root, dest, journal_path):
+    """Run one mode once; the child process --strace measures."""
+    sorter = FileSorter()
+    for mode_name, _, mode in _modes(dest or None, journal_path):
+        if mode_name == name:
+            with contextlib.redirect_stdout(io.StringIO()):
+                mode(sorter, root)
+
+
+def _strace_calls(name, root, dest, journal_path):
+    """Total syscalls of a child running one mode, counted by strace -c.
+
+    An unknown name only starts the interpreter and builds the sorter,
+    which gives the baseline to subtract.
+    """
+    out = journal_path + ".strace"
+    code = "import sys, benchmark; benchmark._run_mode(*sys.argv[1:])"
+    subprocess.run(
+        ["strace", "-f", "-c", "-o", out, sys.executable, "-c", code]
+        + [name, root, dest or "", journal_path],
+        cwd=HERE,
+        check=True,
+    )
+    with open(out) as f:
+        total = [line for line in f if line.rstrip().endswith(" total")][-1]
+    os.remove(out)
+    return int(total.split()[3])
+
+
+def run_benchmark(template, dest=None, repeat=1, profile_dir=None, strace=False):
+    """Time every mode on copies of template.
+
+    Each run gets a fresh copy of the tree (real modes move files away).
+    dest, if given, is a folder (for example on another filesystem) in
+    which a temporary folder receives the category folders. With
+    profile_dir, a cProfile dump of each mode's last run is written there.
+
+    audited_ops_per_file counts the filesystem calls the interpreter audits
+    plus read/write syscalls; stat calls are not among them. With
+    strace=True every mode is also run under strace in a child process for
+    exact syscalls_per_file.
+    """
+    files = sum(len(names) for _, _, names in os.walk(template))
+    work = tempfile.mkdtemp(prefix="sortbench-")
+    root = os.path.join(work, "tree")
+    if dest:
+        dest = tempfile.mkdtemp(prefix="sortbench-", dir=dest)
+    journal_path = os.path.join(work, "journal.jsonl")
+    counter = OpCounter()
+    sorter = FileSorter()
+    results = []
+
+    def fresh():
+        for path in (root, dest):
+            if path and os.path.exists(path):
+                shutil.rmtree(path)
+        shutil.copytree(template, root)
+        if dest:
+            os.makedirs(dest)
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+
+    try:
+        if strace:
+            fresh()
+            baseline = _strace_calls("startup", root, dest, journal_path)
+        for name, real, mode in _modes(dest, journal_path):
+            best = None
+            for _ in range(repeat):
+                fresh()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    with counter.count() as ops:
+                        start = time.perf_counter()
+                        moves = mode(sorter, root)
+                        elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            # Memory and profile come from separate runs, so their
+            # overhead does not show up in the timings
+            fresh()
+            tracemalloc.start()
+            with contextlib.redirect_stdout(io.StringIO()):
+                mode(sorter, root)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            if profile_dir:
+                fresh()
+                profiler = cProfile.Profile()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    profiler.runcall(mode, sorter, root)
+                slug = name.replace(" ", "_").replace("=", "-").replace(":", "-")
+                profiler.dump_stats(os.path.join(profile_dir, f"{slug}.prof"))
+
+            syscalls = None
+            if strace:
+                fresh()
+                syscalls = _strace_calls(name, root, dest, journal_path) - baseline
+
+            results.append(
+                {
+                    "mode": name,
+                    "real": real,
+                    "seconds": best,
+                    "files_per_s": files / best if best else 0,
+                    "audited_ops_per_file": ops["ops"] / files if files else 0,
+                    "syscalls_per_file": (
+                        syscalls / files if syscalls is not None and files else None
+                    ),
+                    "peak_mib": peak / MIB,
+                    "moves": len(moves),
+                }
+            )
+    finally:
+        shutil.rmtree(work)
+        if dest and os.path.exists(dest):
+            shutil.rmtree(dest)
+    return results
+
+
+def print_results(results):
+    print(
+        f"\n{'Mode':<24}{'Seconds':>10}{'Files/s':>12}{'Ops/file':>12}"
+        f"{'Syscalls/file':>15}{'Peak MiB':>10}{'Moves':>8}"
+    )
+    for r in results:
+        syscalls = r["syscalls_per_file"]
+        syscalls = "-" if syscalls is None else f"{syscalls:.1f}"
+        print(
+            f"{r['mode']:<24}{r['seconds']:>10.3f}{r['files_per_s']:>12.0f}"
+            f"{r['audited_ops_per_file']:>12.1f}{syscalls:>15}"
+            f"{r['peak_mib']:>10.1f}{r['moves']:>8}"
+        )
+    print(
+        "\nOps/file counts audited filesystem calls plus reads and writes, "
+        "not stat calls;\nsee Syscalls/file (--strace) for exact counts."
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark FileSorter on a synthetic tree."
+    )
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--unknown-ratio", type=float, default=0.1)
+    parser.add_argument(
+        "--sizes", choices=sorted(SIZE_DISTRIBUTIONS), default="small"
+    )
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--dir", help="build the tree here instead of a temporary directory"
+    )
+    parser.add_argument(
+        "--dest",
+        help="sort into a temporary folder here, e.g. on another filesystem",
+    )
+    parser.add_argument(
+        "--profile", metavar="DIR", help="write a cProfile dump per mode here"
+    )
+    parser.add_argument(
+        "--strace", action="store_true", help="count exact syscalls with strace"
+    )
+    parser.add_argument("--json", metavar="PATH", help="also write results here")
+    args = parser.parse_args()
+    if args.strace and not shutil.which("strace"):
+        parser.error("--strace needs strace on PATH")
+
+    root = args.dir or tempfile.mkdtemp(prefix="sorttree-")
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+    try:
+        print(f"Building {args.files} files in {root} ...")
+        total = build_tree(
+            root,
+            args.files,
+            args.unknown_ratio,
+            args.sizes,
+            args.depth,
+            args.fanout,
+            args.seed,
+        )
+        print(f"{total / MIB:.1f} MiB written.")
+        results = run_benchmark(
+            root, args.dest, args.repeat, args.profile, args.strace
+        )
+    finally:
+        if not args.dir:
+            shutil.rmtree(root)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"options": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import time
+
+# Default --shard parameters: hash levels, and entries per numbered folder.
+DEFAULT_HASH_LEVELS = 1
+DEFAULT_MAX_ENTRIES = 1000
+
+
+class DestIndex:
+    """In-memory index of the files under a destination's category folders.
+
+    Built with one scandir walk per run; after that conflict checks and
+    per-folder entry counts need no filesystem calls. Paths added while
+    planning count as taken too.
+    """
+
+    def __init__(self, dest, categories):
+        self.paths = set()
+        self.counts = {}
+        for category in categories:
+            self._walk(os.path.join(dest, category))
+
+    def _walk(self, top):
+        stack = [top]
+        while stack:
+            folder = stack.pop()
+            try:
+                entries = os.scandir(folder)
+            except OSError:
+                continue
+            with entries:
+                count = 0
+                for entry in entries:
+                    count += 1
+                    self.paths.add(entry.path)
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                self.counts[folder] = count
+
+    def __contains__(self, path):
+        return path in self.paths
+
+    def add(self, path):
+        if path not in self.paths:
+            self.paths.add(path)
+            folder = os.path.dirname(path)
+            self.counts[folder] = self.counts.get(folder, 0) + 1
+            # A new folder is also a new entry of its parent
+            if folder not in self.paths:
+                self.add(folder)
+
+    def count(self, folder):
+        return self.counts.get(folder, 0)
+
+
+class Shard:
+    """Picks the subfolder of a category folder a file goes into.
+
+    spec is one of:
+      "date"       YYYY/MM of the file's modification time
+      "hash[:N]"   N levels of two hex digits from a hash of the file name
+      "count[:N]"  numbered folders 0000, 0001, ... of at most N entries
+    None keeps every category flat. Paths are computed from the name, the
+    stat result and the DestIndex only, never by listing the target.
+    """
+
+    def __init__(self, spec=None):
+        self.spec = spec
+        self.kind, _, arg = (spec or "").partition(":")
+        if self.kind not in ("", "date", "hash", "count"):
+            raise ValueError(f"Unknown shard strategy: {spec}")
+        try:
+            if self.kind == "hash":
+                self.levels = int(arg) if arg else DEFAULT_HASH_LEVELS
+                # An md5 hex digest has 16 two-digit levels
+                if not 1 <= self.levels <= 16:
+                    raise ValueError
+            elif self.kind == "count":
+                self.max_entries = int(arg) if arg else DEFAULT_MAX_ENTRIES
+                if self.max_entries < 1:
+                    raise ValueError
+        except ValueError:
+            limits = "1-16 levels" if self.kind == "hash" else "at least 1 entry"
+            raise ValueError(f"Bad shard spec {spec!r}: needs {limits}") from None
+        # Last numbered folder handed out per category folder
+        self._bucket = {}
+
+    def folder(self, base, name, st, index):
+        """Return the folder under base (dest/<category>) for one file."""
+        if self.kind == "date":
+            t = time.localtime(st().st_mtime)
+            return os.path.join(base, f"{t.tm_year:04d}", f"{t.tm_mon:02d}")
+        if self.kind == "hash":
+            digest = hashlib.md5(name.encode("utf-8", "surrogateescape")).hexdigest()
+            parts = [digest[2 * i : 2 * i + 2] for i in range(self.levels)]
+            return os.path.join(base, *parts)
+        if self.kind == "count":
+            n = self._bucket.get(base, 0)
+            while index.count(os.path.join(base, f"{n:04d}")) >= self.max_entries:
+                n += 1
+            self._bucket[base] = n
+            return os.path.join(base, f"{n:04d}")
+        return base
@@ -0,0 +1,234 @@
+import bisect
+import fnmatch
+import heapq
+import json
+import os
+import re
+import time
+
+DAY = 24 * 60 * 60
+
+# Keys a rule may use besides "category".
+RULE_KEYS = {
+    "ext",
+    "glob",
+    "regex",
+    "min_size",
+    "max_size",
+    "older_than_days",
+    "newer_than_days",
+    "path_prefix",
+}
+
+
+class Rule:
+    """One classification rule: every predicate it sets must match.
+
+    ext is an extension or list of extensions, glob and regex are matched
+    against the file name (regex with re.search semantics and without named
+    groups), sizes are in bytes, ages are days since the last modification
+    and path_prefix is matched against the path relative to the sorted
+    folder, with "/" separators.
+    """
+
+    def __init__(self, category, **predicates):
+        unknown = set(predicates) - RULE_KEYS
+        if unknown:
+            raise ValueError(f"Unknown rule keys for {category!r}: {sorted(unknown)}")
+        self.category = category
+        self.predicates = predicates
+
+        ext = predicates.get("ext")
+        if isinstance(ext, str):
+            ext = [ext]
+        self.exts = {e.lower() for e in ext} if ext else None
+
+        patterns = []
+        if predicates.get("glob"):
+            patterns.append(fnmatch.translate(predicates["glob"]))
+        if predicates.get("regex"):
+            patterns.append(f".*?(?:{predicates['regex']})")
+        # Both must hold when a rule sets both
+        self.pattern = "".join(f"(?=(?:{p}))" for p in patterns) if patterns else None
+        self.name_re = re.compile(self.pattern, re.S) if self.pattern else None
+
+        self.needs_stat = any(
+            key in predicates
+            for key in ("min_size", "max_size", "older_than_days", "newer_than_days")
+        )
+
+    def __repr__(self):
+        return f"Rule({self.category!r}, {self.predicates})"
+
+    def checks(self, name, ext, rel_path, st, now):
+        """Yield (predicate, passed) for every predicate of the rule."""
+        p = self.predicates
+        if self.exts is not None:
+            yield "ext", ext in self.exts
+        if self.name_re is not None:
+            yield "name", self.name_re.match(name) is not None
+        if "path_prefix" in p:
+            yield "path_prefix", rel_path.startswith(p["path_prefix"])
+        if "min_size" in p:
+            yield "min_size", st.st_size >= p["min_size"]
+        if "max_size" in p:
+            yield "max_size", st.st_size <= p["max_size"]
+        if "older_than_days" in p:
+            yield "older_than_days", now - st.st_mtime >= p["older_than_days"] * DAY
+        if "newer_than_days" in p:
+            yield "newer_than_days", now - st.st_mtime < p["newer_than_days"] * DAY
+
+    def range_ok(self, rel_path, st, now):
+        """Check the predicates the dispatch tables did not already cover."""
+        p = self.predicates
+        if "path_prefix" in p and not rel_path.startswith(p["path_prefix"]):
+            return False
+        if not self.needs_stat:
+            return True
+        if "min_size" in p and st.st_size < p["min_size"]:
+            return False
+        if "max_size" in p and st.st_size > p["max_size"]:
+            return False
+        age = now - st.st_mtime
+        if "older_than_days" in p and age < p["older_than_days"] * DAY:
+            return False
+        if "newer_than_days" in p and age >= p["newer_than_days"] * DAY:
+            return False
+        return True
+
+
+class RuleSet:
+    """Rules compiled into one dispatch structure; the first match wins.
+
+    Classifying a file costs one dict lookup on its extension, one match of
+    a combined regex of all name patterns, and range checks on the few
+    rules those two steps leave, whatever the number of rules.
+    """
+
+    def __init__(self, rules, extensions=None):
+        self.rules = list(rules)
+        # The plain extension table is the lowest-priority set of rules
+        for ext, category in (extensions or {}).items():
+            self.rules.append(Rule(category, ext=ext))
+        self._compile()
+
+    @classmethod
+    def from_file(cls, path, extensions=None):
+        """Load rules from a JSON file of the form {"rules": [{...}, ...]}."""
+        with open(path, "r") as f:
+            config = json.load(f)
+        rules = [Rule(**entry) for entry in config.get("rules", [])]
+        return cls(rules, extensions)
+
+    def _compile(self):
+        # Rules split by whether they have a name pattern; each table maps
+        # an extension to candidate rule indices in rule order. Rules
+        # without an ext predicate are candidates for every extension.
+        def tables(indices):
+            any_ext = [i for i in indices if self.rules[i].exts is None]
+            by_ext = {}
+            for i in indices:
+                for ext in self.rules[i].exts or ():
+                    by_ext.setdefault(ext, []).append(i)
+            by_ext = {e: sorted(set(ids) | set(any_ext)) for e, ids in by_ext.items()}
+            return by_ext, any_ext
+
+        plain = [i for i, rule in enumerate(self.rules) if not rule.pattern]
+        named = [i for i, rule in enumerate(self.rules) if rule.pattern]
+        self.plain_by_ext, self.plain_any = tables(plain)
+        self.named_by_ext, self.named_any = tables(named)
+
+        # Alternatives are tried in rule order, and an empty marker group at
+        # the end of each one tells which rule matched first (via lastgroup).
+        self.combined = None
+        if named:
+            self.combined = re.compile(
+                "|".join(f"(?:{self.rules[i].pattern})(?P<_r{i}>)" for i in named),
+                re.S,
+            )
+
+    def _candidates(self, name, ext):
+        """Yield, in rule order, the rules that pass the ext and name stages."""
+        plain = self.plain_by_ext.get(ext, self.plain_any)
+        m = self.combined.match(name) if self.combined else None
+        if m is None:
+            # No name pattern matches at all
+            yield from plain
+            return
+
+        first = int(m.lastgroup[2:])
+        named = self.named_by_ext.get(ext, self.named_any)
+        start = bisect.bisect_left(named, first)
+        # Rules before `first` cannot match; later ones are only tried if
+        # every earlier candidate failed its range checks.
+        later = (
+            named[j]
+            for j in range(start, len(named))
+            if self.rules[named[j]].name_re.match(name)
+        )
+        yield from heapq.merge(plain, later)
+
+    def classify(self, path, root=None, st=None, now=None):
+        """Return the category for path, or None.
+
+        root is the folder being sorted (for path_prefix rules). st may be
+        a stat result or a callable returning one; it is only used when a
+        candidate rule checks size or age.
+        """
+        name = os.path.basename(path)
+        ext = os.path.splitext(name)[1].lower()
+        rel_path = None
+        for i in self._candidates(name, ext):
+            rule = self.rules[i]
+            if rule.needs_stat:
+                st = _resolve_stat(path, st)
+                now = time.time() if now is None else now
+            if "path_prefix" in rule.predicates and rel_path is None:
+                rel_path = _relative(path, root)
+            if rule.range_ok(rel_path, st, now):
+                return rule.category
+        return None
+
+    def explain(self, path, root=None, st=None, now=None):
+        """Describe how path is classified.
+
+        Returns {"category": ..., "candidates": [...]} where each candidate
+        lists its rule index, category, predicate results and whether it
+        matched. Rules the dispatch stages ruled out are not listed.
+        """
+        name = os.path.basename(path)
+        ext = os.path.splitext(name)[1].lower()
+        rel_path = _relative(path, root)
+        st = _resolve_stat(path, st)
+        now = time.time() if now is None else now
+
+        candidates = []
+        category = None
+        for i in self._candidates(name, ext):
+            rule = self.rules[i]
+            checks = dict(rule.checks(name, ext, rel_path, st, now))
+            matched = all(checks.values())
+            candidates.append(
+                {
+                    "rule": i,
+                    "category": rule.category,
+                    "predicates": rule.predicates,
+                    "checks": checks,
+                    "matched": matched,
+                }
+            )
+            if matched:
+                category = rule.category
+                break
+        return {"path": path, "category": category, "candidates": candidates}
+
+
+def _resolve_stat(path, st):
+    if st is None:
+        return os.stat(path)
+    return st() if callable(st) else st
+
+
+def _relative(path, root):
+    rel = os.path.relpath(path, root) if root else path
+    return rel.replace(os.sep, "/")
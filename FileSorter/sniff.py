@@ -0,0 +1,211 @@
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+# Bytes read from the start of each file; enough for the tar header at 257.
+HEADER_BYTES = 512
+
+# (category, label, [(offset, magic), ...], weak). Every (offset, magic) pair
+# must match. Weak signatures are containers (ZIP, OLE2) that also hold
+# formats with their own extension, such as .docx or .xls, or magics short
+# enough to begin ordinary text; they never override a known extension.
+SIGNATURES = [
+    ("image", "png", [(0, b"\x89PNG\r\n\x1a\n")], False),
+    ("image", "jpeg", [(0, b"\xff\xd8\xff")], False),
+    ("image", "gif", [(0, b"GIF87a")], False),
+    ("image", "gif", [(0, b"GIF89a")], False),
+    ("image", "tiff", [(0, b"II*\x00")], False),
+    ("image", "tiff", [(0, b"MM\x00*")], False),
+    ("image", "webp", [(0, b"RIFF"), (8, b"WEBP")], False),
+    ("image", "bmp", [(0, b"BM")], True),
+    ("image", "ico", [(0, b"\x00\x00\x01\x00")], True),
+    ("audio", "wav", [(0, b"RIFF"), (8, b"WAVE")], False),
+    ("audio", "flac", [(0, b"fLaC")], False),
+    ("audio", "ogg", [(0, b"OggS")], False),
+    ("audio", "mp3", [(0, b"ID3")], True),
+    ("audio", "m4a", [(4, b"ftypM4A")], False),
+    ("video", "avi", [(0, b"RIFF"), (8, b"AVI ")], False),
+    ("video", "mkv", [(0, b"\x1a\x45\xdf\xa3")], False),
+    ("video", "flv", [(0, b"FLV\x01")], False),
+    ("video", "wmv", [(0, b"\x30\x26\xb2\x75\x8e\x66\xcf\x11")], False),
+    ("image", "heic", [(4, b"ftypheic")], False),
+    ("image", "heic", [(4, b"ftypmif1")], False),
+    ("video", "mp4", [(4, b"ftyp")], False),
+    ("document", "pdf", [(0, b"%PDF-")], False),
+    ("document", "rtf", [(0, b"{\\rtf")], False),
+    ("document", "ole2", [(0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1")], True),
+    ("archive", "zip", [(0, b"PK\x03\x04")], True),
+    ("archive", "rar", [(0, b"Rar!\x1a\x07")], False),
+    ("archive", "7z", [(0, b"7z\xbc\xaf\x27\x1c")], False),
+    ("archive", "gzip", [(0, b"\x1f\x8b")], False),
+    ("archive", "bzip2", [(0, b"BZh")], True),
+    ("archive", "xz", [(0, b"\xfd7zXZ\x00")], False),
+    ("archive", "tar", [(257, b"ustar")], False),
+    ("executable", "exe", [(0, b"MZ")], True),
+    ("executable", "elf", [(0, b"\x7fELF")], False),
+    ("database", "sqlite", [(0, b"SQLite format 3\x00")], False),
+    ("font", "otf", [(0, b"OTTO")], False),
+    ("font", "ttf", [(0, b"\x00\x01\x00\x00\x00")], True),
+    ("font", "woff", [(0, b"wOFF")], False),
+    ("font", "woff2", [(0, b"wOF2")], False),
+]
+
+# Interpreters named on a "#!" line.
+SHEBANGS = {
+    b"python": "python",
+    b"bash": "shell",
+    b"sh": "shell",
+    b"zsh": "shell",
+    b"perl": "perl",
+    b"ruby": "ruby",
+    b"node": "javascript",
+    b"php": "php",
+}
+
+
+def _compile(signatures):
+    """Index signatures by the first byte of their offset-0 magic.
+
+    Longer magics come first so the most specific signature wins. Those
+    without an offset-0 magic are kept in a short separate list.
+    """
+    by_first = {}
+    other = []
+    for category, label, checks, weak in signatures:
+        entry = (category, label, checks, weak)
+        head = dict(checks).get(0)
+        if head:
+            by_first.setdefault(head[0], []).append(entry)
+        else:
+            other.append(entry)
+    for entries in [*by_first.values(), other]:
+        entries.sort(key=lambda e: -sum(len(magic) for _, magic in e[2]))
+    return by_first, other
+
+
+_BY_FIRST_BYTE, _OTHER = _compile(SIGNATURES)
+
+
+def _matches(header, checks):
+    return all(header[o : o + len(magic)] == magic for o, magic in checks)
+
+
+def match_header(header):
+    """Return (category, label, weak) for a file header, or None."""
+    if not header:
+        return None
+    for category, label, checks, weak in _BY_FIRST_BYTE.get(header[0], ()):
+        if _matches(header, checks):
+            return category, label, weak
+    for category, label, checks, weak in _OTHER:
+        if _matches(header, checks):
+            return category, label, weak
+    if header.startswith(b"#!"):
+        line = header.split(b"\n", 1)[0]
+        words = line[2:].replace(b"/", b" ").split()
+        # "#!/usr/bin/env python3" names the interpreter last
+        for word in reversed(words):
+            name = word.rstrip(b"0123456789.")
+            if name in SHEBANGS:
+                return SHEBANGS[name], name.decode(), True
+    return None
+
+
+def read_header(path, size=HEADER_BYTES):
+    try:
+        with open(path, "rb") as f:
+            return f.read(size)
+    except OSError as e:
+        print(f"Error reading {path}: {e}")
+        return None
+
+
+class SniffCache:
+    """SQLite cache of sniff results keyed by (dev, inode, size, mtime_ns).
+
+    A file whose size or mtime changed misses the cache and is read again.
+    label is NULL for files that matched no signature, so those are not
+    reopened either.
+    """
+
+    def __init__(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sniff ("
+            "dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, "
+            "category TEXT, label TEXT, weak INTEGER, "
+            "PRIMARY KEY (dev, ino))"
+        )
+
+    @staticmethod
+    def default_path():
+        return os.path.join(os.path.expanduser("~"), ".cache", "filesorter.sqlite")
+
+    def get(self, st):
+        """Return (hit, result) for a stat result."""
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, category, label, weak FROM sniff "
+            "WHERE dev = ? AND ino = ?",
+            (st.st_dev, st.st_ino),
+        ).fetchone()
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+            return False, None
+        if row[3] is None:
+            return True, None
+        return True, (row[2], row[3], bool(row[4]))
+
+    def put_many(self, items):
+        """Store (stat, result) pairs."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO sniff VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        st.st_dev,
+                        st.st_ino,
+                        st.st_size,
+                        st.st_mtime_ns,
+                        *(result or (None, None, None)),
+                    )
+                    for st, result in items
+                ],
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def sniff_many(files, workers=8, cache=None):
+    """Sniff a batch of (path, stat) pairs.
+
+    Returns a list of match_header results in input order. Cached results
+    are reused; the remaining headers are read ahead on a thread pool.
+    """
+    results = [None] * len(files)
+    misses = []
+    for i, (path, st) in enumerate(files):
+        hit, result = cache.get(st) if cache is not None else (False, None)
+        if hit:
+            results[i] = result
+        else:
+            misses.append(i)
+
+    paths = [files[i][0] for i in misses]
+    if workers and len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            headers = list(pool.map(read_header, paths))
+    else:
+        headers = [read_header(path) for path in paths]
+
+    fresh = []
+    for i, header in zip(misses, headers):
+        if header is None:
+            continue
+        results[i] = match_header(header)
+        fresh.append((files[i][1], results[i]))
+    if cache is not None and fresh:
+        cache.put_many(fresh)
+    return results
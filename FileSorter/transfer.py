@@ -0,0 +1,405 @@
+import errno
+import json
+import os
+import shutil
+import threading
+import time
+
+JOURNAL_NAME = ".filesorter-journal.jsonl"
+
+# Suffix of a copy in progress; it only gets the real name once complete.
+PART_SUFFIX = ".part"
+
+# Bytes asked of the kernel per copy_file_range / sendfile call.
+COPY_CHUNK = 1024 * 1024 * 1024
+
+# Errors meaning a zero-copy syscall can't be used for this pair of files.
+_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.EBADF,
+}
+
+
+def _copy_data(fin, fout, size):
+    """Copy size bytes between open files, in the kernel where possible.
+
+    Tries copy_file_range (which can also reflink), then sendfile, then a
+    userspace copy. A method that stops short of size (some filesystems
+    return 0 instead of an error) hands over to the next one, and if even
+    the userspace copy doesn't come to size bytes OSError is raised, so a
+    truncated copy is never taken for a complete one.
+    """
+    in_fd, out_fd = fin.fileno(), fout.fileno()
+    for syscall in ("copy_file_range", "sendfile"):
+        if not hasattr(os, syscall):
+            continue
+        fout.seek(0)
+        fout.truncate()
+        copied = 0
+        try:
+            while copied < size:
+                count = min(COPY_CHUNK, size - copied)
+                if syscall == "copy_file_range":
+                    n = os.copy_file_range(in_fd, out_fd, count, copied, copied)
+                else:
+                    n = os.sendfile(out_fd, in_fd, copied, count)
+                if n == 0:
+                    break
+                copied += n
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+        if copied == size:
+            return
+    fin.seek(0)
+    fout.seek(0)
+    fout.truncate()
+    shutil.copyfileobj(fin, fout)
+    if fout.tell() != size:
+        raise OSError(
+            errno.EIO, f"copied {fout.tell()} of {size} bytes; source changed?"
+        )
+
+
+def rename_noreplace(src, dest):
+    """Rename src to dest, raising FileExistsError rather than replacing dest.
+
+    Done as a hard link plus unlink: the link fails if dest exists, also
+    when it differs only in case on a case-insensitive filesystem. Where
+    hard links aren't supported it falls back to a lexists check before
+    os.rename, which narrows the window but can't close it.
+    """
+    try:
+        os.link(src, dest, follow_symlinks=False)
+    except FileExistsError:
+        raise
+    except (OSError, NotImplementedError) as e:
+        if getattr(e, "errno", None) == errno.EXDEV:
+            raise
+        if os.path.lexists(dest):
+            raise FileExistsError(errno.EEXIST, "File exists", dest)
+        os.rename(src, dest)
+        return
+    os.unlink(src)
+
+
+def copy_file(src, dest):
+    """Copy src to dest crash-safely, keeping its metadata.
+
+    The data goes to dest + PART_SUFFIX, is fsynced, and is only then
+    renamed to dest, so dest is either absent or complete. Raises
+    FileExistsError, and leaves dest alone, if dest (or its part file)
+    already exists.
+    """
+    if os.path.lexists(dest):
+        raise FileExistsError(errno.EEXIST, "File exists", dest)
+    part = dest + PART_SUFFIX
+    # Exclusive, so two copies racing for one name never share a part file
+    fout = open(part, "xb")
+    try:
+        with open(src, "rb") as fin, fout:
+            _copy_data(fin, fout, os.fstat(fin.fileno()).st_size)
+            fout.flush()
+            os.fsync(fout.fileno())
+        shutil.copystat(src, part)
+        rename_noreplace(part, dest)
+    except BaseException:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        raise
+
+
+def move_file(src, dest):
+    """Move src to dest: a rename, or a safe copy and delete across devices.
+
+    Never replaces an existing dest (FileExistsError). Returns "renamed" or
+    "copied".
+    """
+    try:
+        rename_noreplace(src, dest)
+        return "renamed"
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    copy_file(src, dest)
+    os.remove(src)
+    return "copied"
+
+
+def make_folders(folders):
+    """os.makedirs every folder; returns the ones, parents included, that
+    did not exist before."""
+    created = []
+    for folder in sorted(folders):
+        missing = []
+        parent = folder
+        while parent and not os.path.isdir(parent):
+            missing.append(parent)
+            parent = os.path.dirname(parent)
+        os.makedirs(folder, exist_ok=True)
+        created += reversed(missing)
+    return created
+
+
+def _same_file_data(src, dest):
+    """True if dest looks like a finished copy of src (copystat keeps mtime)."""
+    try:
+        a, b = os.stat(src), os.stat(dest)
+    except OSError:
+        return False
+    return a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns
+
+
+class Journal:
+    """Write-ahead journal of moves, one JSON record per line.
+
+    A run first appends (and fsyncs) a "move" record for every planned move,
+    and the folders it had to create, then a "done" or "failed" record as
+    each move settles. Moves with
+    neither are reconciled against the filesystem by resume(), which marks
+    the ones it cannot finish "failed" so they are not retried; undo()
+    moves the files of the last run back and records them as "undone".
+    compact() drops the settled runs undo() no longer needs, so the
+    journal stays about the size of the last run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def _append(self, records, sync=False):
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a")
+            for record in records:
+                self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            if sync:
+                os.fsync(self.file.fileno())
+
+    def begin(self, moves, folders=()):
+        """Record a planned run of Move tuples, and the folders created for
+        it (which undo() removes again); returns its run id.
+
+        Paths are stored absolute, so resume and undo work from any folder.
+        """
+        run = time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}-{time.time_ns()}"
+        records = [
+            {
+                "run": run,
+                "op": "move",
+                "id": i,
+                "src": os.path.abspath(m.src),
+                "dest": os.path.abspath(m.dest),
+            }
+            for i, m in enumerate(moves)
+        ]
+        if folders:
+            records.append(
+                {
+                    "run": run,
+                    "op": "mkdir",
+                    "paths": [os.path.abspath(folder) for folder in folders],
+                }
+            )
+        self._append(records, sync=True)
+        return run
+
+    def failed(self, run, i):
+        """Record move i of run as failed, so resume() leaves it alone."""
+        self._append([{"run": run, "op": "failed", "id": i}])
+
+    def done(self, run, i, dest=None):
+        """Record move i of run as done; dest is where the file ended up
+        if that differs from the plan."""
+        record = {"run": run, "op": "done", "id": i}
+        if dest is not None:
+            record["dest"] = os.path.abspath(dest)
+        self._append([record])
+
+    def _records(self):
+        """Yield the journal's records in order, skipping a torn last line
+        from a crash."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def load(self):
+        """Return {run: {"moves": {id: (src, dest)}, "folders": [path],
+        <op>: set of ids, ...}}.
+
+        Runs are in the order they were started.
+        """
+        runs = {}
+        for record in self._records():
+            run = runs.setdefault(
+                record["run"],
+                {
+                    "moves": {},
+                    "folders": [],
+                    "done": set(),
+                    "failed": set(),
+                    "undone": set(),
+                },
+            )
+            if record["op"] == "mkdir":
+                run["folders"] += record["paths"]
+                continue
+            if record["op"] == "move":
+                run["moves"][record["id"]] = (record["src"], record["dest"])
+                continue
+            run[record["op"]].add(record["id"])
+            if "dest" in record:
+                # Renamed at apply time to avoid a conflict
+                src, _ = run["moves"][record["id"]]
+                run["moves"][record["id"]] = (src, record["dest"])
+        return runs
+
+    def unfinished(self):
+        """Return [(run, id, src, dest)] for planned moves not yet settled.
+
+        Read in one pass that only holds the moves still open, not the
+        whole history.
+        """
+        pending = {}
+        for record in self._records():
+            if record["op"] == "move":
+                key = (record["run"], record["id"])
+                pending[key] = (record["src"], record["dest"])
+            elif record["op"] in ("done", "failed"):
+                pending.pop((record["run"], record["id"]), None)
+        return [(run, i, src, dest) for (run, i), (src, dest) in pending.items()]
+
+    def compact(self):
+        """Drop the runs resume() and undo() have no more use for.
+
+        Runs with unsettled moves are kept, and so is the last run undo()
+        would move back; everything else goes. The journal is rewritten
+        under a temporary name and swapped in, so a crash leaves either
+        the old or the new one.
+        """
+        with self.lock:
+            pending, undoable = {}, {}
+            for record in self._records():
+                run, op = record["run"], record["op"]
+                todo = pending.setdefault(run, set())
+                done = undoable.setdefault(run, set())
+                if op == "move":
+                    todo.add(record["id"])
+                elif op in ("done", "failed"):
+                    todo.discard(record["id"])
+                    if op == "done":
+                        done.add(record["id"])
+                elif op == "undone":
+                    done.discard(record["id"])
+            last = next((run for run in reversed(list(undoable)) if undoable[run]), None)
+            keep = {run for run, todo in pending.items() if todo or run == last}
+            if len(keep) == len(pending):
+                return
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            tmp = self.path + ".tmp"
+            with open(self.path, "r") as fin, open(tmp, "w") as fout:
+                for line in fin:
+                    try:
+                        if json.loads(line)["run"] in keep:
+                            fout.write(line)
+                    except ValueError:
+                        continue
+                fout.flush()
+                os.fsync(fout.fileno())
+            os.replace(tmp, self.path)
+
+    def resume(self):
+        """Finish the moves an interrupted run left. Returns result counts."""
+        result = {"renamed": 0, "copied": 0, "failed": 0}
+        unfinished = self.unfinished()
+        for run, i, src, dest in unfinished:
+            part = dest + PART_SUFFIX
+            try:
+                if os.path.lexists(part):
+                    os.remove(part)
+                if not os.path.lexists(src):
+                    if not os.path.lexists(dest):
+                        raise FileNotFoundError(errno.ENOENT, "source is gone", src)
+                    # Moved before the "done" record was written
+                elif os.path.lexists(dest):
+                    if not _same_file_data(src, dest):
+                        raise FileExistsError(errno.EEXIST, "destination taken", dest)
+                    # Copied, but the source was not yet removed
+                    os.remove(src)
+                    result["copied"] += 1
+                else:
+                    os.makedirs(os.path.dirname(dest), exist_ok=True)
+                    result[move_file(src, dest)] += 1
+            except OSError as e:
+                print(f"Failed to resume {src}: {e}")
+                result["failed"] += 1
+                self.failed(run, i)
+                continue
+            self.done(run, i)
+        if unfinished:
+            self.compact()
+        return result
+
+    def undo(self):
+        """Move the files of the last completed run back where they were.
+
+        Returns result counts, or None if there is nothing to undo.
+        """
+        runs = self.load()
+        for run in reversed(list(runs)):
+            state = runs[run]
+            todo = sorted(state["done"] - state["undone"], reverse=True)
+            if todo:
+                break
+        else:
+            return None
+
+        result = {"renamed": 0, "copied": 0, "failed": 0}
+        for i in todo:
+            src, dest = state["moves"][i]
+            try:
+                if os.path.lexists(src):
+                    raise FileExistsError(errno.EEXIST, "original name taken", src)
+                os.makedirs(os.path.dirname(src) or ".", exist_ok=True)
+                result[move_file(dest, src)] += 1
+            except OSError as e:
+                print(f"Failed to undo {dest}: {e}")
+                result["failed"] += 1
+                continue
+            self._append([{"run": run, "op": "undone", "id": i}])
+
+        # Drop the folders the run created, deepest first, where undo
+        # emptied them
+        for folder in sorted(state["folders"], key=len, reverse=True):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                pass
+        return result
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
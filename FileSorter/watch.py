@@ -0,0 +1,301 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from collections import deque
+
+# inotify(7) event masks.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    | IN_DELETE_SELF | IN_MOVE_SELF
+)
+
+# Seconds of recent batches the reported files/s rate is taken over.
+RATE_WINDOW = 60.0
+
+_EVENT = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+class InotifyBackend:
+    """Reports changed file names in one folder using Linux inotify.
+
+    Blocks in select() until the kernel has events, so an idle inbox costs
+    no CPU. Talks to libc through ctypes, so it needs nothing outside the
+    standard library.
+    """
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"cannot watch {folder}")
+
+    def wait(self, timeout):
+        """Return the names changed within timeout seconds (None = forever).
+
+        Returns None instead of a set when events were lost and the folder
+        has to be rescanned.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    raise OSError("watched folder was removed")
+                if name and not mask & IN_ISDIR:
+                    names.add(os.fsdecode(name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingBackend:
+    """Reports changed file names by comparing folder listings.
+
+    Used where inotify is unavailable. Each poll is one scandir of the
+    folder; between polls the process sleeps.
+    """
+
+    def __init__(self, folder, interval=1.0):
+        self.folder = folder
+        self.interval = interval
+        self.snapshot = {}
+
+    def wait(self, timeout):
+        if timeout is None or timeout > self.interval:
+            timeout = self.interval
+        time.sleep(timeout)
+        current = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        st = entry.stat()
+                        current[entry.name] = (st.st_size, st.st_mtime_ns)
+                except OSError:
+                    continue
+        changed = {
+            name for name, sig in current.items() if self.snapshot.get(name) != sig
+        }
+        self.snapshot = current
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_backend(folder, poll=False, interval=1.0):
+    """Return an inotify backend for folder, or a polling one as fallback."""
+    if not poll:
+        try:
+            return InotifyBackend(folder)
+        except (OSError, AttributeError):
+            pass
+    return PollingBackend(folder, interval)
+
+
+class Watcher:
+    """Sorts files as they arrive in a folder, in micro-batches.
+
+    A file is queued on every change and only sorted once it has been quiet
+    for `settle` seconds, so files still being written are left alone. Up
+    to batch_size settled files are planned and applied together.
+    """
+
+    def __init__(
+        self,
+        sorter,
+        source,
+        dest=None,
+        settle=2.0,
+        batch_size=500,
+        workers=4,
+        poll=False,
+        poll_interval=1.0,
+        dry_run=False,
+        plan_options=None,
+        journal=None,
+    ):
+        self.sorter = sorter
+        self.source = source
+        self.dest = dest
+        self.settle = settle
+        self.batch_size = batch_size
+        self.workers = workers
+        self.dry_run = dry_run
+        self.plan_options = plan_options or {}
+        self.journal = journal
+        # Walked once here, then kept current by every plan()
+        self.index = sorter.dest_index(source if dest is None else dest)
+        self.backend = open_backend(source, poll, poll_interval)
+        self.pending = {}
+        inotify = isinstance(self.backend, InotifyBackend)
+        self.stats = {
+            "backend": "inotify" if inotify else "poll",
+            "seen": 0,
+            "sorted": 0,
+            "skipped": 0,
+            "failed": 0,
+            "batches": 0,
+            "queue": 0,
+            "files_per_s": 0.0,
+            "batch_files_per_s": 0.0,
+        }
+        self.started = time.monotonic()
+        # (finish time, files sorted) of the batches inside RATE_WINDOW
+        self._recent = deque()
+
+    def _queue(self, names):
+        now = time.monotonic()
+        for name in names:
+            if name not in self.pending:
+                self.stats["seen"] += 1
+            self.pending[name] = now
+
+    def _rescan(self):
+        with os.scandir(self.source) as entries:
+            self._queue(entry.name for entry in entries if entry.is_file())
+
+    def _timeout(self):
+        """Seconds until the oldest queued file settles; None if none are."""
+        if not self.pending:
+            return None
+        oldest = min(self.pending.values())
+        return max(0.0, oldest + self.settle - time.monotonic())
+
+    def _settled(self):
+        now = time.monotonic()
+        ready = [n for n, t in self.pending.items() if now - t >= self.settle]
+        ready.sort(key=self.pending.get)
+        return ready[: self.batch_size]
+
+    def _sort_batch(self, names):
+        wanted = set(names)
+        for name in names:
+            del self.pending[name]
+        # A writer without events (or a clock-skewed copy) may still be busy
+        wall = time.time()
+        entries = []
+        for entry in self.sorter.scan(self.source):
+            if entry.name not in wanted:
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            if wall - mtime < self.settle:
+                self.pending[entry.name] = time.monotonic()
+            else:
+                entries.append(entry)
+        if not entries:
+            return
+
+        start = time.monotonic()
+        moves, skipped = self.sorter.plan(
+            self.source,
+            self.dest,
+            entries=entries,
+            index=self.index,
+            **self.plan_options,
+        )
+        self.stats["skipped"] += len(skipped)
+        if self.dry_run:
+            for move in moves:
+                print(f"[DRY RUN] {move.src} -> {move.dest}")
+            done = len(moves)
+        else:
+            result = self.sorter.apply(moves, self.workers, self.journal)
+            done = result["renamed"] + result["copied"]
+            self.stats["failed"] += result["failed"]
+        now = time.monotonic()
+        self.stats["sorted"] += done
+        self.stats["batches"] += 1
+        self.stats["batch_files_per_s"] = done / max(now - start, 1e-6)
+        self._recent.append((now, done))
+        self.report()
+
+    def counters(self):
+        """Return the throughput and queue-depth counters.
+
+        files_per_s is the rate over the last RATE_WINDOW seconds (or the
+        uptime, if shorter), so it falls to 0 when the folder goes quiet
+        and rises again with the next burst; batch_files_per_s is the rate
+        of the last batch while it ran.
+        """
+        now = time.monotonic()
+        while self._recent and self._recent[0][0] < now - RATE_WINDOW:
+            self._recent.popleft()
+        window = min(RATE_WINDOW, now - self.started)
+        recent = sum(done for _, done in self._recent)
+        self.stats["queue"] = len(self.pending)
+        self.stats["files_per_s"] = recent / window if window > 0 else 0.0
+        return dict(self.stats)
+
+    def report(self):
+        c = self.counters()
+        print(
+            f"[watch] {c['batches']} batches: {c['sorted']} sorted, "
+            f"{c['skipped']} skipped, {c['failed']} failed, queue {c['queue']}, "
+            f"{c['files_per_s']:.1f} files/s (last batch "
+            f"{c['batch_files_per_s']:.0f} files/s)"
+        )
+
+    def run(self, stop_after=None):
+        """Watch until interrupted (or for stop_after seconds)."""
+        deadline = None if stop_after is None else time.monotonic() + stop_after
+        self._rescan()
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                timeout = self._timeout()
+                if deadline is not None:
+                    left = max(0.0, deadline - time.monotonic())
+                    timeout = left if timeout is None else min(timeout, left)
+                changed = self.backend.wait(timeout)
+                if changed is None:
+                    self._rescan()
+                else:
+                    self._queue(changed)
+                batch = self._settled()
+                while batch:
+                    self._sort_batch(batch)
+                    batch = self._settled()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.backend.close()
+        return self.counters()
@@ -0,0 +1,280 @@
+import builtins
+import re
+import time
+
+PYTHON_KEYWORDS = [
+    "def",
+    "class",
+    "if",
+    "elif",
+    "else",
+    "try",
+    "except",
+    "for",
+    "while",
+    "import",
+    "from",
+    "as",
+    "return",
+    "with",
+    "lambda",
+    "True",
+    "False",
+    "None",
+    "in",
+    "not",
+    "and",
+    "or",
+    "break",
+    "continue",
+    "pass",
+    "global",
+    "nonlocal",
+    "raise",
+    "yield",
+    "assert",
+    "print",
+    "input",
+]
+
+BUILTINS = {
+    name for name in dir(builtins) if not name.startswith("_")
+} - set(PYTHON_KEYWORDS)
+
+TAGS = ("keyword", "builtin", "string", "comment", "number")
+
+TRIPLE_QUOTES = ('"""', "'''")
+
+# Lines an edit may re-tokenize at once in background mode.
+SYNC_LINES = 200
+
+# Seconds of tokenizing per background slice.
+SLICE_SECONDS = 0.01
+
+_PREFIX = r"(?:\b[rRbBuUfF]{1,2})?"
+
+# Everything the highlighter colours, tried left to right in one scan.
+# Words are matched whole and looked up afterwards, so a keyword inside an
+# identifier is never coloured. Strings left open run to the end of the
+# line; an open triple-quoted string ("opened") carries on to the next.
+TOKEN_RE = re.compile(
+    r"(?P<comment>#.*)"
+    rf"|(?P<string>{_PREFIX}(?:'''(?:\\.|[^\\])*?'''|\"\"\"(?:\\.|[^\\])*?\"\"\""
+    r"|'(?!'')(?:\\.|[^\\'])*'?|\"(?!\"\")(?:\\.|[^\\\"])*\"?))"
+    rf"|(?P<opened>{_PREFIX}(?P<quote>'''|\"\"\").*)"
+    r"|(?P<number>\b(?:0[xX][\da-fA-F_]+|0[bB][01_]+|0[oO][0-7_]+"
+    r"|\d[\d_]*\.?[\d_]*(?:[eE][+-]?\d+)?[jJ]?)\b|\B\.\d[\d_]*(?:[eE][+-]?\d+)?[jJ]?\b)"
+    r"|(?P<word>[^\W\d]\w*)"
+)
+
+# Where a triple-quoted string that is already open ends.
+_CLOSE_RE = {
+    quote: re.compile(r"(?:\\.|[^\\])*?" + quote) for quote in TRIPLE_QUOTES
+}
+
+_WORD_TAGS = dict.fromkeys(BUILTINS, "builtin")
+_WORD_TAGS.update(dict.fromkeys(PYTHON_KEYWORDS, "keyword"))
+
+
+def tokenize_line(line, state=""):
+    """Return ([(tag, start, end)], state) for one line of Python.
+
+    state is "" outside strings, or the quotes of a triple-quoted string
+    still open at the start of the line; the returned state is the same
+    for the end of the line.
+    """
+    spans = []
+    pos = 0
+    if state:
+        m = _CLOSE_RE[state].match(line)
+        if m is None:
+            return [("string", 0, len(line))], state
+        pos = m.end()
+        spans.append(("string", 0, pos))
+
+    for m in TOKEN_RE.finditer(line, pos):
+        kind = m.lastgroup
+        if kind == "word":
+            tag = _WORD_TAGS.get(m.group())
+            if tag:
+                spans.append((tag, m.start(), m.end()))
+        elif kind == "opened":
+            spans.append(("string", m.start(), m.end()))
+            return spans, m.group("quote")
+        else:
+            spans.append((kind, m.start(), m.end()))
+    return spans, ""
+
+
+class Highlighter:
+    """Keeps the syntax tags of a Text widget up to date edit by edit.
+
+    Inserts and deletes on the widget go through a Tcl proxy that notes the
+    lines each one touched. update() re-tokenizes only those lines, carrying
+    the open-string state from line to line, and carries on past them only
+    while a line's end state differs from what the next line started with.
+
+    With background set, no call tokenizes more than a screenful or so of
+    lines: show_visible() does the lines on screen at once, guessing their
+    start state if need be, and the rest of the document is done from the
+    top down in short slices run when Tk is idle (see schedule). Every edit
+    cancels the pending slice and queues a new one.
+
+    The widget must be empty when the highlighter is attached.
+    """
+
+    def __init__(self, text, background=True):
+        self.text = text
+        self.background = background
+        # states[n] is the tokenizer state at the end of line n (states[0]
+        # is the state at the start of line 1); None means the line still
+        # has to be tokenized.
+        self.states = ["", ""]
+        # Lines before the frontier are tokenized from their true start state
+        self.frontier = 2
+        # (first, last) lines edited since the last update
+        self.dirty = None
+        self._job = None
+        self._orig = text._w + "_orig"
+        text.tk.call("rename", text._w, self._orig)
+        text.tk.createcommand(text._w, self._dispatch)
+
+    def _dispatch(self, operation, *args):
+        call = self.text.tk.call
+        if operation not in ("insert", "delete", "replace"):
+            return call(self._orig, operation, *args)
+        before = self._line_count()
+        line = int(str(call(self._orig, "index", args[0])).split(".")[0])
+        result = call(self._orig, operation, *args)
+        self.notice(min(line, before), self._line_count() - before)
+        self.schedule()
+        return result
+
+    def _line_count(self):
+        return int(str(self.text.tk.call(self._orig, "index", "end-1c")).split(".")[0])
+
+    def notice(self, line, delta):
+        """Record an edit starting on line that added delta lines (or removed
+        -delta lines) right after it."""
+        if delta > 0:
+            self.states[line:line] = [None] * delta
+        elif delta < 0:
+            del self.states[line : line - delta]
+        if line < self.frontier:
+            self.frontier = max(self.frontier + delta, line + 1)
+        last = line + max(delta, 0)
+        if self.dirty is not None:
+            first, end = self.dirty
+            if end >= line:
+                last = max(last, end + delta)
+            line = min(line, first)
+        self.dirty = (line, last)
+
+    def _lines(self, first, last, block=100):
+        """Yield the widget's lines from first on, fetched a block at a time."""
+        count = len(self.states) - 1
+        while first <= count:
+            stop = min(max(first + block, last + 1), count + 1)
+            yield from self.text.get(f"{first}.0", f"{stop - 1}.end").split("\n")
+            first = stop
+
+    def _retag(self, first, last, spans):
+        ranges = {tag: [] for tag in TAGS}
+        for tag, row, start, stop in spans:
+            ranges[tag] += (f"{row}.{start}", f"{row}.{stop}")
+        # One Tk call per tag, however many ranges it has
+        for tag in TAGS:
+            self.text.tag_remove(tag, f"{first}.0", f"{last}.end")
+            if ranges[tag]:
+                self.text.tag_add(tag, *ranges[tag])
+
+    def update(self):
+        """Re-tag the lines edited since the last update.
+
+        Returns the number of lines re-tokenized. In background mode edits
+        past the frontier, and whatever an edit affects beyond SYNC_LINES,
+        are only marked for show_visible() and the background fill.
+        """
+        if self.dirty is None:
+            return 0
+        count = len(self.states) - 1
+        first, last = self.dirty
+        self.dirty = None
+        last = min(last, count)
+        first = min(first, last)
+        if self.background and first >= self.frontier:
+            self.states[first : last + 1] = [None] * (last - first + 1)
+            return 0
+
+        limit = first + SYNC_LINES if self.background else count
+        state = self.states[first - 1]
+        spans = []
+        line = first
+        for line, text in enumerate(self._lines(first, min(last, limit)), first):
+            found, end = tokenize_line(text, state)
+            spans.extend((tag, line, start, stop) for tag, start, stop in found)
+            known, self.states[line] = self.states[line], end
+            if line >= last and (known == end or line >= self.frontier - 1):
+                self.frontier = max(self.frontier, line + 1)
+                break
+            if line >= limit:
+                # Too much for one keystroke; the fill picks it up from here
+                self.frontier = line + 1
+                self.states[line + 1 : last + 1] = [None] * max(0, last - line)
+                break
+            state = end
+        self._retag(first, line, spans)
+        return line - first + 1
+
+    def show_visible(self):
+        """Tokenize the lines on screen that the fill hasn't reached yet.
+
+        Returns the number of lines re-tokenized.
+        """
+        top = int(self.text.index("@0,0").split(".")[0])
+        height = self.text.winfo_height()
+        bottom = int(self.text.index(f"@0,{height}").split(".")[0])
+        first = max(top, self.frontier)
+        if first > bottom or None not in self.states[first : bottom + 1]:
+            return 0
+        # Until the fill gets here the true start state isn't known
+        state = self.states[first - 1] or ""
+        spans = []
+        for line, text in enumerate(self._lines(first, bottom), first):
+            if line > bottom:
+                break
+            found, state = tokenize_line(text, state)
+            spans.extend((tag, line, start, stop) for tag, start, stop in found)
+            self.states[line] = state
+        self._retag(first, bottom, spans)
+        return bottom - first + 1
+
+    def schedule(self):
+        """Cancel the pending background slice and queue a new one."""
+        if self._job is not None:
+            self.text.after_cancel(self._job)
+            self._job = None
+        if self.background and (self.dirty or self.frontier < len(self.states)):
+            self._job = self.text.after_idle(self._fill)
+
+    def _fill(self):
+        """One background slice: pending edits, the screen, then SLICE_SECONDS
+        of tokenizing onwards from the frontier."""
+        self._job = None
+        self.update()
+        self.show_visible()
+        first = self.frontier
+        if first >= len(self.states):
+            return
+        deadline = time.perf_counter() + SLICE_SECONDS
+        state = self.states[first - 1]
+        spans = []
+        for line, text in enumerate(self._lines(first, first), first):
+            found, state = tokenize_line(text, state)
+            spans.extend((tag, line, start, stop) for tag, start, stop in found)
+            self.states[line] = state
+            if time.perf_counter() >= deadline:
+                break
+        self.frontier = line + 1
+        self._retag(first, line, spans)
+        self.schedule()
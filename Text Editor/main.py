@@ -1,40 +1,7 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
 
-PYTHON_KEYWORDS = [
-    "def",
-    "class",
-    "if",
-    "elif",
-    "else",
-    "try",
-    "except",
-    "for",
-    "while",
-    "import",
-    "from",
-    "as",
-    "return",
-    "with",
-    "lambda",
-    "True",
-    "False",
-    "None",
-    "in",
-    "not",
-    "and",
-    "or",
-    "break",
-    "continue",
-    "pass",
-    "global",
-    "nonlocal",
-    "raise",
-    "yield",
-    "assert",
-    "print",
-    "input",
-]
+from highlight import Highlighter
 
 
 class TextEditor:
@@ -44,6 +11,7 @@ class TextEditor:
         self.root.geometry("800x600")
 
         self.file_path = None
+        self._line_count = 0
 
         self._create_widgets()
         self._create_menu()
@@ -64,7 +32,11 @@ class TextEditor:
         self.line_numbers.pack(side="left", fill="y")
 
         self.text = tk.Text(self.root, wrap="none", undo=True, font=("Consolas", 12))
+        self.scrollbar = tk.Scrollbar(self.root, command=self.text.yview)
+        self.scrollbar.pack(side="right", fill="y")
         self.text.pack(fill="both", expand=True)
+        self.text.config(yscrollcommand=self._on_scroll)
+        self.highlighter = Highlighter(self.text)
 
         self.text.bind("<KeyRelease>", self._on_key_release)
         self.text.bind("<Button-1>", lambda e: self._update_line_numbers())
@@ -76,52 +48,41 @@ class TextEditor:
         self.text.tag_config("keyword", foreground="magenta")
         self.text.tag_config("string", foreground="green")
         self.text.tag_config("comment", foreground="gray")
+        self.text.tag_config("builtin", foreground="blue")
+        self.text.tag_config("number", foreground="darkorange")
 
     def _on_key_release(self, event=None):
         self._highlight_syntax()
         self._update_line_numbers()
 
+    def _on_scroll(self, first, last):
+        # Called for every change of view: wheel, scrollbar, keys, edits
+        self.scrollbar.set(first, last)
+        self.highlighter.show_visible()
+
     def _highlight_syntax(self):
-        content = self.text.get("1.0", "end-1c")
-        self.text.tag_remove("keyword", "1.0", "end")
-        self.text.tag_remove("string", "1.0", "end")
-        self.text.tag_remove("comment", "1.0", "end")
-
-        lines = content.split("\n")
-        for i, line in enumerate(lines):
-            index = f"{i+1}.0"
-            words = line.split(" ")
-            pos = 0
-            while pos < len(line):
-                for word in PYTHON_KEYWORDS:
-                    if line[pos:].startswith(word) and (
-                        pos + len(word) == len(line)
-                        or not line[pos + len(word)].isalnum()
-                    ):
-                        self.text.tag_add(
-                            "keyword", f"{i+1}.{pos}", f"{i+1}.{pos+len(word)}"
-                        )
-                if line[pos] == "#":
-                    self.text.tag_add("comment", f"{i+1}.{pos}", f"{i+1}.end")
-                    break
-                elif line[pos] in ("'", '"'):
-                    quote = line[pos]
-                    end = pos + 1
-                    while end < len(line) and line[end] != quote:
-                        end += 1
-                    end = min(end + 1, len(line))
-                    self.text.tag_add("string", f"{i+1}.{pos}", f"{i+1}.{end}")
-                    pos = end - 1
-                pos += 1
+        # Only the edited lines and the lines on screen are tokenized here;
+        # the highlighter does the rest of the file while Tk is idle
+        self.highlighter.update()
+        self.highlighter.show_visible()
 
     def _update_line_numbers(self):
-        self.line_numbers.config(state="normal")
-        self.line_numbers.delete("1.0", "end")
-
         line_count = int(self.text.index("end-1c").split(".")[0])
-        line_text = "\n".join(str(i) for i in range(1, line_count + 1))
-        self.line_numbers.insert("1.0", line_text)
+        if line_count == self._line_count:
+            return
+        self.line_numbers.config(state="normal")
+        if line_count > self._line_count:
+            # Append only the numbers of the new lines
+            line_text = "\n".join(
+                str(i) for i in range(self._line_count + 1, line_count + 1)
+            )
+            if self._line_count:
+                line_text = "\n" + line_text
+            self.line_numbers.insert("end-1c", line_text)
+        else:
+            self.line_numbers.delete(f"{line_count}.end", "end-1c")
         self.line_numbers.config(state="disabled")
+        self._line_count = line_count
 
     def _create_menu(self):
         menu_bar = tk.Menu(self.root)